@@ -1,77 +1,169 @@
-from flask import Flask, render_template, request, jsonify, send_from_directory, session, redirect, url_for
+from flask import Flask, Blueprint, render_template, request, jsonify, send_from_directory, send_file, session, redirect, url_for, abort
 import os
+import io
 import json
+import hashlib
+import click
 import uuid
 from werkzeug.utils import secure_filename
-# --- ИЗМЕНЕНИЯ ЗДЕСЬ ---
-# from pdf2image import convert_from_path # <-- УДАЛЕНО
-import fitz # <-- ДОБАВЛЕНО: PyMuPDF
-# -----------------------
-import gspread
-from google.oauth2.service_account import Credentials
+from werkzeug.security import safe_join
 from datetime import datetime
-import re
-from config_0 import Config
+from config import Config, configure
+from log_utils import configure_logging
 from auth_utils import auth_manager, login_required
+from pdf_utils import convert_pdf_to_images, read_pdf_pages, page_variants, variant_filename, VARIANT_MIMETYPES
+from conversion_jobs import conversion_jobs
+import render_cache
+from upload_utils import StreamingRequest, check_pdf
+import page_cache
+import template_store
+import grading
+import sheets_utils
+import sheets_client
+import result_store
+import http_utils
+import metrics
+import profiling
+import warmup
+import executors
 
-app = Flask(__name__)
-app.config.from_object(Config)
-app.secret_key = app.config['SECRET_KEY']
+# Маршруты приложения; само приложение собирает create_app
+bp = Blueprint('main', __name__)
 
-# Создаем необходимые папки
-Config.create_directories()
+
+def create_app(config_class=None):
+    """Фабрика приложения.
+
+    config_class — класс или имя профиля из config.CONFIGS; без него действует профиль
+    из APP_CONFIG (и изменения Config, сделанные до вызова). Продакшен: gunicorn wsgi:app.
+    """
+    if config_class is not None:
+        configure(config_class)
+    if not Config.SECRET_KEY:
+        raise RuntimeError("Не задан SECRET_KEY (переменная окружения SECRET_KEY)")
+    configure_logging()
+
+    app = Flask(__name__)
+    app.request_class = StreamingRequest
+    app.config.from_object(Config)
+    app.secret_key = app.config['SECRET_KEY']
+
+    app.register_blueprint(bp)
+    app.cli.add_command(migrate_templates_command)
+
+    app.teardown_request(discard_uploads)
+    app.after_request(http_utils.compress_response)
+    app.before_request(metrics.start_request)
+    app.after_request(metrics.record_request)
+    app.before_request(profiling.start_profile)
+    app.after_request(profiling.finish_profile)
+    app.teardown_request(profiling.stop_profile)
+    app.register_error_handler(413, upload_too_large)
+    app.register_error_handler(executors.ExecutorBusy, executor_busy)
+
+    # Создаем необходимые папки
+    Config.create_directories()
+
+    if Config.TEMPLATE_INDEX_REBUILD_ON_START:
+        template_store.rebuild_index()
+
+    # Досылаем в Google Sheets работы, не отправленные до перезапуска
+    if Config.RESULT_STORE_ENABLED and result_store.pending_count():
+        result_store.start_outbox()
+
+    # Сеть и тяжелые модули при запуске не трогаем: таблица пользователей подключается при
+    # первом входе, fitz и gspread импортируются при первом использовании или в прогреве
+    if Config.WARMUP_ON_START:
+        warmup.start()
+
+    return app
+
+@click.command('migrate-templates')
+@click.option('--format', 'storage_format', type=click.Choice(template_store.STORAGE_FORMATS),
+              default=None, help='Формат файлов (по умолчанию Config.TEMPLATE_STORAGE_FORMAT)')
+def migrate_templates_command(storage_format):
+    """Перезаписывает шаблоны из templates_json в выбранном формате"""
+    migrated, bytes_before, bytes_after = template_store.migrate_templates(storage_format)
+    click.echo(f"Перезаписано шаблонов: {migrated}. Размер: {bytes_before} -> {bytes_after} байт")
+
+def discard_uploads(exc):
+    """Удаляет принятые, но не сохраненные файлы загрузки (*.part)"""
+    for file in request.__dict__.get('files', {}).values():
+        if hasattr(file.stream, 'discard'):
+            file.stream.discard()
+
+def upload_too_large(e):
+    limit_mb = Config.MAX_UPLOAD_FILE_BYTES // (1024 * 1024)
+    return jsonify({'error': f'Файл слишком большой (максимум {limit_mb} МБ)'}), 413
+
+def executor_busy(e):
+    """Пул Sheets или рендеринга перегружен: клиент повторит запрос позже"""
+    return jsonify({'success': False, 'error': 'Сервер перегружен, повторите запрос позже'}), 503, {'Retry-After': '5'}
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in Config.ALLOWED_EXTENSIONS
 
-# ==============================================================================
-# НОВАЯ ФУНКЦИЯ КОНВЕРТАЦИИ PDF с использованием fitz
-# ==============================================================================
-def convert_pdf_to_images(pdf_path, output_dir):
-    """Конвертация PDF в PNG изображения с использованием PyMuPDF и передача масштаба для полей"""
-    image_data = []
-    base_name = os.path.splitext(os.path.basename(pdf_path))[0]
-    
-    try:
-        doc = fitz.open(pdf_path)
-        zoom = Config.PDF_DPI / 72.0
-        matrix = fitz.Matrix(zoom, zoom)
-        
-        for i, page in enumerate(doc):
-            pix = page.get_pixmap(matrix=matrix)
-            image_filename = f"{base_name}_page_{i+1}.png"
-            image_path = os.path.join(output_dir, image_filename)
-            pix.save(image_path)
-            
-            image_data.append({
-                'filename': image_filename,
-                'width': pix.width,
-                'height': pix.height,
-                'page_width': page.rect.width,   # ширина страницы в PDF points
-                'page_height': page.rect.height, # высота страницы в PDF points
-                'zoom': zoom
-            })
-        
-        doc.close()
-        return image_data
-    except Exception as e:
-        print(f"Ошибка конвертации PDF (PyMuPDF): {e}")
+def is_async_upload():
+    """Фоновая конвертация включается параметром async или Config.UPLOAD_ASYNC"""
+    flag = request.values.get('async')
+    if flag is None:
+        return Config.UPLOAD_ASYNC
+    return flag.lower() in ('1', 'true', 'yes')
+
+def pdf_upload_result(image_data):
+    return {
+        'success': True,
+        'files': [item['filename'] for item in image_data],
+        'images_data': image_data,  # данные о размере, zoom и page_height
+        'type': 'pdf'
+    }
+
+def stamp_version(image_data, pdf_hash):
+    """Версия страниц для URL (?v=): одинаковый PDF с одинаковыми настройками дает те же картинки"""
+    version = render_cache.content_version(pdf_hash)
+    for item in image_data:
+        item['version'] = version
+    return image_data
+
+def convert_and_cache(pdf_path, pdf_hash, progress=None):
+    """Конвертация PDF с сохранением результата в кэш рендеринга"""
+    image_data = convert_pdf_to_images(pdf_path, Config.UPLOAD_FOLDER, progress=progress)
+    if image_data:
+        stamp_version(image_data, pdf_hash)
+        render_cache.put(pdf_hash, image_data)
+    return image_data
+
+def save_submissions(template_id, template_name, sheet_url, question_headers, graded):
+    """Сохраняет проверенные работы: [(student_info, answers, result, row), ...].
+
+    С RESULT_STORE_ENABLED работы сначала фиксируются в SQLite, а в Google Sheets
+    их отправляет outbox; иначе строки сразу уходят в save_results.
+    Возвращает sheets_result для ответа клиенту (None, если таблица не указана).
+    """
+    if Config.RESULT_STORE_ENABLED:
+        ids = result_store.record(template_id, template_name, sheet_url, question_headers, graded)
+        if not sheet_url:
+            return None
+        return {
+            "success": True,
+            "queued": True,
+            "message": "Результаты сохранены и будут записаны в Google Таблицу",
+            "headers": question_headers,
+            "submission_ids": ids,
+            "pending": result_store.pending_count()
+        }
+
+    if not sheet_url:
         return None
-# ==============================================================================
+    return sheets_utils.save_results(sheet_url, question_headers, [row for *_, row in graded])
 
 def save_to_google_sheets(sheet_url, student_data):
     """Сохранение результатов в Google Таблицы"""
+    import gspread  # тяжелый импорт — только при первой записи
+
     try:
-        # Загружаем credentials
-        creds_path = os.path.join(Config.CREDENTIALS_FOLDER, 'credentials.json')
-        if not os.path.exists(creds_path):
-            return {"error": "Файл credentials.json не найден"}
-        
-        creds = Credentials.from_service_account_file(creds_path, scopes=Config.GOOGLE_SHEETS_SCOPES)
-        client = gspread.authorize(creds)
-        
-        # Открываем таблицу по URL
-        sheet = client.open_by_url(sheet_url)
+        # Открываем таблицу по URL через общий клиент
+        sheet = sheets_client.open_by_url(sheet_url)
         
         # Создаем или получаем лист "Результаты"
         try:
@@ -106,15 +198,15 @@ def save_to_google_sheets(sheet_url, student_data):
     except Exception as e:
         return {"error": str(e)}
 
-@app.route('/')
+@bp.route('/')
 @login_required
 def index():
     return render_template('editor.html', login=session.get('login'))
     
-@app.route('/login', methods=['GET', 'POST'])
+@bp.route('/login', methods=['GET', 'POST'])
 def login():
     if session.get('logged_in'):
-        return redirect(url_for('index'))
+        return redirect(url_for('main.index'))
         
     error = None
     if request.method == 'POST':
@@ -126,25 +218,33 @@ def login():
         if result['success']:
             session['logged_in'] = True
             session['login'] = result['login']
-            next_url = request.args.get('next') or url_for('index')
+            next_url = request.args.get('next') or url_for('main.index')
             return redirect(next_url)
         else:
             error = result['error']
             
     return render_template('login.html', error=error)
 
-@app.route('/logout')
+@bp.route('/logout')
 def logout():
     session.pop('logged_in', None)
     session.pop('login', None)
-    return redirect(url_for('login'))
+    return redirect(url_for('main.login'))
+
+
+@bp.route('/auth/invalidate_users', methods=['POST'])
+@login_required
+def invalidate_users():
+    """Сброс кэша пользователей после изменения таблицы логинов"""
+    auth_manager.invalidate_users()
+    return jsonify({'success': True})
 
 
-@app.route('/student')
+@bp.route('/student')
 def student():
     return render_template('student.html')
 
-@app.route('/upload', methods=['POST'])
+@bp.route('/upload', methods=['POST'])
 @login_required
 def upload_file():
     if 'file' not in request.files:
@@ -156,18 +256,52 @@ def upload_file():
     
     if file and allowed_file(file.filename):
         filename = secure_filename(file.filename)
+        if filename.lower().endswith('.pdf'):
+            # Исходный PDF всегда хранится как <base>.pdf: по этому имени ленивый режим
+            # находит его для страниц <base>_page_N.png
+            filename = f"{filename[:-4]}.pdf"
         file_path = os.path.join(Config.UPLOAD_FOLDER, filename)
-        file.save(file_path)
+        upload = file.stream  # HashingUploadFile: файл уже на диске, хэш посчитан при приеме
+
+        if filename.lower().endswith('.pdf'):
+            # Проверяем PDF до сохранения и рендеринга
+            error = check_pdf(upload)
+            if error:
+                upload.discard()
+                return jsonify({'error': error}), 400
+
+        upload.commit(file_path)
         
         if filename.lower().endswith('.pdf'):
-            image_data = convert_pdf_to_images(file_path, Config.UPLOAD_FOLDER)
-            if image_data:
+            # Тот же PDF с теми же настройками уже отрендерен — отдаем готовые страницы
+            pdf_hash = upload.hexdigest()
+            cached = render_cache.get(pdf_hash, filename[:-4])
+            if cached:
+                return jsonify(pdf_upload_result(stamp_version(cached, pdf_hash)))
+
+            # Ленивый режим: сохраняем только PDF и размеры страниц, рендер — при первом запросе
+            if Config.PDF_LAZY_RENDER:
+                # Страницы прошлой загрузки под этим именем иначе отдавались бы вместо новых
+                page_cache.remove_pages(filename[:-4])
+                image_data = read_pdf_pages(file_path)
+                if image_data:
+                    return jsonify(pdf_upload_result(stamp_version(image_data, pdf_hash)))
+                return jsonify({'error': 'Ошибка конвертации PDF'}), 500
+
+            if is_async_upload():
+                job_id = conversion_jobs.submit(convert_and_cache, file_path, pdf_hash)
+                if not job_id:
+                    return jsonify({'error': 'Очередь конвертации переполнена, попробуйте позже'}), 503
                 return jsonify({
                     'success': True,
-                    'files': [item['filename'] for item in image_data],
-                    'images_data': image_data,  # данные о размере, zoom и page_height
+                    'job_id': job_id,
+                    'status_url': url_for('main.upload_status', job_id=job_id),
                     'type': 'pdf'
-                })
+                }), 202
+
+            image_data = convert_and_cache(file_path, pdf_hash)
+            if image_data:
+                return jsonify(pdf_upload_result(image_data))
             else:
                 return jsonify({'error': 'Ошибка конвертации PDF'}), 500
         else:
@@ -180,11 +314,63 @@ def upload_file():
     return jsonify({'error': 'Неподдерживаемый формат файла'}), 400
 
 
-@app.route('/uploads/<filename>')
+@bp.route('/upload_status/<job_id>')
+@login_required
+def upload_status(job_id):
+    job = conversion_jobs.get(job_id)
+    if not job:
+        return jsonify({'error': 'Задача не найдена'}), 404
+
+    response = {
+        'success': job['status'] != 'error',
+        'status': job['status'],
+        'pages_done': job['pages_done'],
+        'pages_total': job['pages_total']
+    }
+    if job['status'] == 'done':
+        response.update(pdf_upload_result(job['result']))
+    elif job['status'] == 'error':
+        response['error'] = job['error']
+    return jsonify(response)
+
+
+@bp.route('/uploads/<filename>')
 def uploaded_file(filename):
-    return send_from_directory(Config.UPLOAD_FOLDER, filename)
+    # ?size=<вариант> — уменьшенная копия страницы (thumb, screen); без нее или для
+    # страниц, загруженных до появления вариантов, отдается исходный файл
+    size = request.args.get('size')
+    response = None
+    if size in page_variants() and filename.endswith('.png'):
+        response = serve_page_file(variant_filename(filename, size))
+    if response is None:
+        response = serve_page_file(filename)
+    if response is None:
+        abort(404)
+
+    # ?v=<версия> из images_data делает URL неизменяемым, только если это версия текущего
+    # PDF: после перезагрузки под тем же именем старый URL снова перепроверяется по ETag
+    version = request.args.get('v')
+    immutable = bool(version) and version == page_cache.page_version(filename)
+    return http_utils.page_cache_control(response, immutable=immutable)
 
-@app.route('/save_template', methods=['POST'])
+def serve_page_file(filename):
+    """Файл страницы со строгим ETag; conditional GET (304) и Range обрабатывает send_file"""
+    path = safe_join(Config.UPLOAD_FOLDER, filename)
+    if path and os.path.isfile(path):
+        return send_from_directory(Config.UPLOAD_FOLDER, filename, etag=http_utils.file_etag(path))
+
+    # Страница еще не отрендерена (ленивый режим) — строим из исходного PDF
+    data = page_cache.get_page(filename)
+    if data is None:
+        return None
+    extension = filename.rsplit('.', 1)[-1]
+    return send_file(
+        io.BytesIO(data),
+        mimetype=VARIANT_MIMETYPES[extension],
+        etag=http_utils.content_etag(data)
+    )
+
+@bp.route('/save_template', methods=['POST'])
 @login_required
 def save_template():
     try:
@@ -194,55 +380,158 @@ def save_template():
         if 'template_id' not in data or not data['template_id']:
             data['template_id'] = f"tpl_{uuid.uuid4().hex[:8]}"
         
-        # Сохраняем в JSON файл
-        filename = f"{data['template_id']}.json"
-        filepath = os.path.join(Config.TEMPLATES_FOLDER, filename)
-        
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
+        # Сохраняем в JSON файл (кэш шаблонов обновляется сразу)
+        version = template_store.save_template(data)
         
-        return jsonify({'success': True, 'template_id': data['template_id']})
+        return jsonify({'success': True, 'template_id': data['template_id'], 'version': version})
     
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/load_template/<template_id>')
+@bp.route('/templates/<template_id>/fields', methods=['PATCH'])
+@login_required
+def patch_template_fields(template_id):
+    """Изменение отдельных полей шаблона без пересылки всего шаблона.
+
+    Тело: {"base_version": N, "ops": [{"op": "add" | "update" | "delete", ...}]}
+    """
+    try:
+        data = request.get_json() or {}
+        ops = data.get('ops')
+        if not isinstance(ops, list):
+            return jsonify({'error': 'Нужен список операций ops'}), 400
+
+        version = template_store.patch_fields(template_id, ops, data.get('base_version'))
+        if version is None:
+            return jsonify({'error': 'Шаблон не найден'}), 404
+
+        return jsonify({'success': True, 'template_id': template_id, 'version': version})
+
+    except template_store.TemplateConflict as e:
+        return jsonify({'error': str(e)}), 409
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/load_template/<template_id>')
 def load_template(template_id):
     try:
-        filepath = os.path.join(Config.TEMPLATES_FOLDER, f"{template_id}.json")
-        
-        if not os.path.exists(filepath):
+        data, version = template_store.load_template_with_version(template_id)
+        if data is None:
             return jsonify({'error': 'Шаблон не найден'}), 404
-        
-        with open(filepath, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        
-        return jsonify(data)
+
+        # Версия шаблона (mtime, размер файла) служит ETag — повторная загрузка получает 304
+        mtime_ns, size = version
+        return http_utils.conditional_json(
+            lambda: data,
+            etag=f"{template_id}-{mtime_ns:x}-{size:x}",
+            last_modified=http_utils.mtime_datetime(mtime_ns)
+        )
     
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/list_templates')
+@bp.route('/list_templates')
 def list_templates():
     try:
-        templates = []
-        if os.path.exists(Config.TEMPLATES_FOLDER):
-            for filename in os.listdir(Config.TEMPLATES_FOLDER):
-                if filename.endswith('.json'):
-                    filepath = os.path.join(Config.TEMPLATES_FOLDER, filename)
-                    with open(filepath, 'r', encoding='utf-8') as f:
-                        data = json.load(f)
-                        templates.append({
-                            'id': data.get('template_id', filename[:-5]),
-                            'name': data.get('name', filename[:-5])
-                        })
-        
-        return jsonify(templates)
+        # ?class=8A — только шаблоны класса; ?page=N&per_page=M — постранично
+        class_name = request.args.get('class')
+        per_page = request.args.get('per_page', type=int)
+        page = request.args.get('page', 1, type=int)
+        if page < 1 or (per_page is not None and per_page < 1):
+            return jsonify({'error': 'page и per_page должны быть не меньше 1'}), 400
+        offset = (page - 1) * per_page if per_page else 0
+
+        index_mtime = template_store.index_version()
+        query = f"{class_name}|{page}|{per_page}"
+        etag = f"list-{index_mtime:x}-{hashlib.sha256(query.encode()).hexdigest()[:12]}"
+
+        # Общее число нужно и в 304, поэтому выборка строится до проверки ETag
+        templates, total = template_store.list_templates(class_name, offset, per_page)
+
+        response = http_utils.conditional_json(
+            lambda: templates,
+            etag=etag,
+            last_modified=http_utils.mtime_datetime(index_mtime)
+        )
+        response.headers['X-Total-Count'] = str(total)
+        return response
     
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/check_answers', methods=['POST'])
+@bp.route('/cache_stats')
+@login_required
+def cache_stats():
+    return jsonify({
+        'templates': template_store.stats(),
+        'answer_keys': grading.stats(),
+        'sheets_queue': sheets_utils.result_writer.status(),
+        'result_outbox': result_store.outbox_status(),
+        'pages': page_cache.stats(),
+        'executors': executors.status()
+    })
+
+@bp.route('/metrics')
+def metrics_endpoint():
+    """Метрики процесса в формате Prometheus"""
+    if not session.get('logged_in'):
+        if Config.METRICS_TOKEN:
+            if request.headers.get('Authorization') != f"Bearer {Config.METRICS_TOKEN}":
+                abort(401)
+        elif Config.METRICS_REQUIRE_AUTH:
+            # Токен не задан: в продакшене метрики видны только вошедшему учителю
+            abort(404)
+    return metrics.render(), 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+
+@bp.route('/ready')
+def ready():
+    """Проверка готовности: 503, пока идет прогрев, затем 200 с состоянием зависимостей"""
+    is_ready = warmup.is_ready()
+    return jsonify({
+        'ready': is_ready,
+        'warmup': warmup.status(),
+        'auth': auth_manager.status(),
+        'executors': executors.status()
+    }), 200 if is_ready else 503
+
+@bp.route('/profiles')
+@login_required
+def list_profiles():
+    return jsonify({'sample_rate': profiling.sample_rate(), 'profiles': profiling.list_profiles()})
+
+@bp.route('/profiles/settings', methods=['POST'])
+@login_required
+def profile_settings():
+    """{"sample_rate": 0.05} — профилировать 5% всех запросов (0 — выключить)"""
+    data = request.get_json() or {}
+    try:
+        rate = profiling.set_sample_rate(data.get('sample_rate', 0))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'sample_rate должен быть числом от 0 до 1'}), 400
+    return jsonify({'success': True, 'sample_rate': rate})
+
+@bp.route('/profiles/<profile_id>')
+@login_required
+def download_profile(profile_id):
+    """Файл .prof для pstats/snakeviz; ?format=text — текстовый отчет (?sort=tottime)"""
+    if request.args.get('format') == 'text':
+        sort = request.args.get('sort', 'cumulative')
+        if sort not in ('cumulative', 'tottime', 'calls', 'ncalls'):
+            return jsonify({'error': 'Неизвестная сортировка'}), 400
+        text = profiling.profile_text(profile_id, sort)
+        if text is None:
+            abort(404)
+        return text, 200, {'Content-Type': 'text/plain; charset=utf-8'}
+
+    path = profiling.profile_path(profile_id)
+    if path is None:
+        abort(404)
+    return send_file(path, mimetype='application/octet-stream', as_attachment=True,
+                     download_name=f"{profile_id}.prof")
+
+@bp.route('/check_answers', methods=['POST'])
 def check_answers():
     try:
         data = request.get_json()
@@ -251,126 +540,27 @@ def check_answers():
         student_info = data.get('student_info', {})
         sheet_url = data.get('sheet_url')
 
-        # Загружаем шаблон
-        template_path = os.path.join(Config.TEMPLATES_FOLDER, f"{template_id}.json")
-        if not os.path.exists(template_path):
+        # Загружаем шаблон (из кэша, если файл не менялся)
+        template, version = template_store.load_template_with_version(template_id)
+        if template is None:
             return jsonify({"success": False, "error": "Шаблон не найден"})
 
-        with open(template_path, 'r', encoding='utf-8') as f:
-            template = json.load(f)
+        # Проверка ответов по скомпилированному ключу шаблона
+        answer_key = grading.get_answer_key(template_id, version, template)
+        result = grading.grade(answer_key, answers)
+        correct_count = result['correct_count']
+        total_count = result['total_count']
+        percentage = result['percentage']
+        detailed_results = result['details']
+        question_headers = answer_key.headers
 
-        # Сортируем поля по ID для обеспечения консистентного порядка
-        #fields = sorted(template.get('fields', []), key=lambda x: x['id'])
-        fields = template.get('fields', []) 
-        
-        # Проверка ответов
-        correct_count = 0
-        total_count = len(fields)
-        detailed_results = []
-        student_answers_list = [] 
-        question_headers = [] 
-
-        for i, field in enumerate(fields):
-            field_id = field['id']
-            correct_variants = [v.strip().lower() for v in field.get('variants', [])]
-            student_answer = answers.get(field_id, "").strip()
-            student_answer_lower = student_answer.lower()
-
-            is_correct = student_answer_lower in correct_variants if correct_variants else False
-            if is_correct:
-                correct_count += 1
-
-            detailed_results.append({
-                "field_id": field_id,
-                "student_answer": student_answer,
-                "correct_variants": correct_variants,
-                "is_correct": is_correct
-            })
-            
-            student_answers_list.append(student_answer)
-            
-            if correct_variants:
-                base_header = correct_variants[0]
-                clean_header = re.sub(r'[^\w\s\-а-яёА-ЯЁ]', '', base_header)
-                clean_header = clean_header[:30].strip()
-                
-                if not clean_header:
-                    clean_header = f"Вопрос {i+1}"
-                
-                header = clean_header
-                if clean_header in question_headers:
-                    header = f"{clean_header} ({i+1})"
-            else:
-                header = f"Вопрос {i+1}"
-            
-            question_headers.append(header)
-
-        percentage = round((correct_count / total_count) * 100, 2) if total_count else 0
-
-        # Запись в Google Sheets
-        sheets_result = None
-        if sheet_url:
-            try:
-                creds_path = os.path.join(Config.CREDENTIALS_FOLDER, 'credentials.json')
-                if not os.path.exists(creds_path):
-                    sheets_result = {"success": False, "error": "Файл credentials.json не найден"}
-                else:
-                    creds = Credentials.from_service_account_file(creds_path, scopes=Config.GOOGLE_SHEETS_SCOPES)
-                    client = gspread.authorize(creds)
-                    
-                    sheet = client.open_by_url(sheet_url)
-                    
-                    try:
-                        worksheet = sheet.worksheet("Результаты")
-                    except gspread.WorksheetNotFound:
-                        worksheet = sheet.add_worksheet(title="Результаты", rows=1000, cols=10)
-                    
-                    try:
-                        existing_data = worksheet.get_all_values()
-                    except:
-                        existing_data = []
-                    
-                    base_headers = [
-                        "Название шаблона",
-                        "ФИО", 
-                        "Класс",
-                        "Дата",
-                        "Время",
-                        "Правильных ответов",
-                        "Всего вопросов",
-                        "Процент"
-                    ]
-                    
-                    all_headers = base_headers + question_headers
-                    
-                    if not existing_data or existing_data[0] != all_headers:
-                        worksheet.clear()
-                        worksheet.append_row(all_headers)
-                    
-                    now = datetime.now()
-                    base_row_data = [
-                        template.get("name", template_id),
-                        student_info.get("name", ""),
-                        student_info.get("class", ""),
-                        now.strftime("%d.%m.%Y"),
-                        now.strftime("%H:%M:%S"),
-                        correct_count,
-                        total_count,
-                        f"{percentage}%"
-                    ]
-                    
-                    complete_row_data = base_row_data + student_answers_list
-                    
-                    worksheet.append_row(complete_row_data)
-                    
-                    sheets_result = {
-                        "success": True,
-                        "message": f"Результаты сохранены. Добавлено {len(complete_row_data)} значений",
-                        "headers": question_headers
-                    }
-                    
-            except Exception as e:
-                sheets_result = {"success": False, "error": str(e)}
+        # Сохранение результата (локальная база и/или Google Sheets)
+        template_name = template.get("name", template_id)
+        row = sheets_utils.result_row(template_name, student_info, result)
+        sheets_result = save_submissions(
+            template_id, template_name, sheet_url, question_headers,
+            [(student_info, answers, result, row)]
+        )
 
         return jsonify({
             "success": True,
@@ -385,12 +575,76 @@ def check_answers():
     except Exception as e:
         return jsonify({"success": False, "error": str(e)})
 
-@app.route('/static/classes.json')
+@bp.route('/check_answers_batch', methods=['POST'])
+def check_answers_batch():
+    """Проверка пачки работ по одному шаблону: {template_id, sheet_url, submissions: [{student_info, answers}]}.
+
+    Все работы проверяются по одному скомпилированному ключу, в Google Sheets уходит
+    одна запись append_rows со всеми строками.
+    """
+    try:
+        data = request.get_json()
+        template_id = data.get('template_id')
+        submissions = data.get('submissions', [])
+        sheet_url = data.get('sheet_url')
+
+        if not isinstance(submissions, list) or not submissions:
+            return jsonify({"success": False, "error": "Нет работ для проверки"})
+        if len(submissions) > Config.BATCH_MAX_SUBMISSIONS:
+            return jsonify({"success": False, "error": f"Слишком много работ (максимум {Config.BATCH_MAX_SUBMISSIONS})"})
+
+        template, version = template_store.load_template_with_version(template_id)
+        if template is None:
+            return jsonify({"success": False, "error": "Шаблон не найден"})
+
+        answer_key = grading.get_answer_key(template_id, version, template)
+        template_name = template.get("name", template_id)
+
+        results = []
+        graded = []
+        now = datetime.now()
+        for submission in submissions:
+            student_info = submission.get('student_info', {})
+            answers = submission.get('answers', {})
+            result = grading.grade(answer_key, answers)
+            row = sheets_utils.result_row(template_name, student_info, result, now)
+            graded.append((student_info, answers, result, row))
+            results.append({
+                "student_info": student_info,
+                "correct_count": result['correct_count'],
+                "total_count": result['total_count'],
+                "percentage": result['percentage'],
+                "details": result['details']
+            })
+
+        sheets_result = save_submissions(template_id, template_name, sheet_url, answer_key.headers, graded)
+
+        return jsonify({
+            "success": True,
+            "results": results,
+            "sheets_result": sheets_result,
+            "question_headers": answer_key.headers
+        })
+
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)})
+
+@bp.route('/results/<template_id>')
+@login_required
+def template_results(template_id):
+    """Результаты по шаблону из локальной базы (?limit=&offset=)"""
+    limit = min(request.args.get('limit', 100, type=int), 1000)
+    offset = request.args.get('offset', 0, type=int)
+    return jsonify(result_store.list_results(template_id, limit, offset))
+
+# classes.json: (mtime_ns, размер) -> разобранный список
+_classes_cache = {'signature': None, 'data': None}
+
+@bp.route('/static/classes.json')
 def get_classes():
+    classes_path = os.path.join(Config.STATIC_FOLDER, 'classes.json')
     try:
-        classes_path = os.path.join(Config.STATIC_FOLDER, 'classes.json')
-        with open(classes_path, 'r', encoding='utf-8') as f:
-            return json.load(f)
+        stat = os.stat(classes_path)
     except FileNotFoundError:
         default_classes = [
             "1А", "1Б", "1В",
@@ -407,11 +661,23 @@ def get_classes():
         ]
         
         os.makedirs(Config.STATIC_FOLDER, exist_ok=True)
-        classes_path = os.path.join(Config.STATIC_FOLDER, 'classes.json')
         with open(classes_path, 'w', encoding='utf-8') as f:
             json.dump(default_classes, f, ensure_ascii=False, indent=2)
-        
-        return jsonify(default_classes)
+        stat = os.stat(classes_path)
+
+    # Файл перечитывается только после изменения
+    signature = (stat.st_mtime_ns, stat.st_size)
+    if _classes_cache['signature'] != signature:
+        with open(classes_path, 'r', encoding='utf-8') as f:
+            _classes_cache['data'] = json.load(f)
+        _classes_cache['signature'] = signature
+
+    classes = _classes_cache['data']
+    return http_utils.conditional_json(
+        lambda: classes,
+        etag=f"classes-{stat.st_mtime_ns:x}-{stat.st_size:x}",
+        last_modified=http_utils.mtime_datetime(stat.st_mtime_ns)
+    )
 
 if __name__ == '__main__':
-    app.run(debug=Config.DEBUG)
\ No newline at end of file
+    create_app().run(debug=Config.DEBUG)
\ No newline at end of file
@@ -1,116 +1,213 @@
-import os
+import logging
+import threading
+import time
 from datetime import datetime
-import gspread
-from google.oauth2.service_account import Credentials
 from flask import session, redirect, url_for, request # Импортируем для декоратора
 from config import Config
 from functools import wraps
+import sheets_client
+from sheets_client import credentials_from_env
+import metrics
+import executors
+
+logger = logging.getLogger(__name__)
 
 class AuthManager:
     """Менеджер авторизации, использующий Google Sheets для данных пользователей."""
     
     def __init__(self):
-        # Инициализация gspread клиента
+        # Общий gspread клиент из sheets_client (учетные данные из переменных окружения)
         self.client = None
         self.sheet = None
-        
-        # ❌ УДАЛЕНО: self.creds_path = Config.get_credentials_path()
-        # ❌ УДАЛЕНО: Проверка if not os.path.exists(self.creds_path):
 
-        # 1. Получаем учетные данные из переменных окружения
-        credentials_info = self._get_credentials_from_env()
+        # Кэш пользователей: {логин: запись из таблицы}
+        self.users = None
+        self.users_loaded_at = 0
+        self.users_lock = threading.Lock()
+        self.refreshing = False
 
-        if not credentials_info:
-            print("WARNING: Google API credentials (secrets) not found in environment variables.")
-            print("СИСТЕМА АВТОРИЗАЦИИ ТРЕБУЕТ НАСТРОЙКИ! Проверьте Replit App Secrets.")
-            return
+        # Подключение к таблице откладывается до первого входа (или фонового прогрева),
+        # чтобы запуск приложения не ходил в сеть. После ошибки следующая попытка —
+        # не раньше чем через AUTH_CONNECT_RETRY_SECONDS
+        self.connect_lock = threading.Lock()
+        self.next_connect_at = 0
+        self.warned_unconfigured = False
 
-        try:
-            # 2. Авторизация клиента с помощью словаря данных
-            creds = Credentials.from_service_account_info(credentials_info, scopes=Config.GOOGLE_SHEETS_SCOPES)
-            self.client = gspread.authorize(creds)
-            # 3. Открытие таблицы (предполагаем, что данные в первом листе)
-            self.sheet = self.client.open_by_url(Config.USERS_SHEET_URL).sheet1
-        except Exception as e:
-            print(f"Error connecting to Google Sheets for Auth: {e}")
-            self.client = None
+    def _connect(self):
+        """Подключается к таблице пользователей при первом обращении. True, если подключение есть"""
+        if self.sheet is not None:
+            return True
 
-    def _get_credentials_from_env(self):
-        """Собирает информацию сервисного аккаунта из переменных окружения Replit Secrets."""
-        
-        # Проверяем наличие ключевого секрета (client_email), чтобы избежать лишней работы
-        if not os.environ.get("client_email"):
-            return None
+        with self.connect_lock:
+            if self.sheet is not None:
+                return True
+            if time.monotonic() < self.next_connect_at:
+                return False
 
-        # ВАЖНО: Заменяем \\n на \n в private_key, иначе ключ не сработает!
-        private_key = os.environ.get("private_key", "").replace('\\n', '\n')
-        
-        # Простая проверка, что ключ не пуст после замены
-        if not private_key or not os.environ.get("project_id"):
-             return None
+            configured = credentials_from_env() or sheets_client.local_endpoint()
+            if not configured or not Config.USERS_SHEET_URL:
+                if not self.warned_unconfigured:
+                    logger.warning("Учетные данные Google API (Replit App Secrets) или USERS_SHEET_URL "
+                                   "не заданы: система авторизации требует настройки")
+                    self.warned_unconfigured = True
+                self.next_connect_at = time.monotonic() + Config.AUTH_CONNECT_RETRY_SECONDS
+                return False
+
+            try:
+                with metrics.timed('auth', 'connect'):
+                    # Сетевые вызовы — в пуле 'sheets', поток запроса ждет не дольше таймаута
+                    client, sheet = executors.get('sheets').call(
+                        self._open_sheet, timeout=Config.SHEETS_CALL_TIMEOUT_SECONDS)
+            except executors.ExecutorBusy:
+                # Перегрузка пула — не ошибка подключения: без паузы до повтора, маршрут ответит 503
+                raise
+            except Exception as e:
+                logger.error("Ошибка подключения к таблице пользователей", extra={'error': str(e)})
+                self.next_connect_at = time.monotonic() + Config.AUTH_CONNECT_RETRY_SECONDS
+                return False
+
+            self.client = client
+            self.sheet = sheet
+            return True
 
-        # Собираем данные в словарь, используя имена переменных из Replit Secrets
+    @staticmethod
+    def _open_sheet():
+        client = sheets_client.get_client('users')
+        # Открытие таблицы (предполагаем, что данные в первом листе)
+        return client, sheets_client.open_by_url(Config.USERS_SHEET_URL, 'users').sheet1
+
+    def warm_up(self):
+        """Подключение и загрузка таблицы пользователей заранее (фоновый прогрев при запуске)"""
+        if not self._connect():
+            return False
+        with self.users_lock:
+            loaded = self.users is not None
+        return loaded or self._load_users()
+
+    def status(self):
+        """Состояние подключения и кэша пользователей для /ready"""
+        with self.users_lock:
+            users = self.users
+            age = time.monotonic() - self.users_loaded_at
         return {
-            "type": "service_account",
-            "project_id": os.environ.get("project_id"),
-            "private_key_id": os.environ.get("private_key_id"),
-            "private_key": private_key,
-            "client_email": os.environ.get("client_email"),
-            "client_id": os.environ.get("client_id"),
-            "auth_uri": os.environ.get("auth_uri"),
-            "token_uri": os.environ.get("token_uri"),
-            "auth_provider_x509_cert_url": os.environ.get("auth_provider_x509_cert_url"),
-            "client_x509_cert_url": os.environ.get("client_x509_cert_url"),
-            "universe_domain": os.environ.get("universe_domain")
+            'connected': self.sheet is not None,
+            'users_cached': users is not None,
+            'users_age_seconds': round(age, 1) if users is not None else None
         }
-    
+
     def _fetch_users_data(self):
         """Получает данные пользователей из Google Таблицы."""
-        if not self.sheet:
+        if not self._connect():
             return None
 
         # Ожидаемые заголовки: Login, Password, Expiration Date (в формате YYYY-MM-DD)
         try:
             # Получаем все записи как список словарей
-            records = self.sheet.get_all_records()
+            with metrics.timed('auth', 'load_users'):
+                records = executors.get('sheets').call(
+                    self.sheet.get_all_records, timeout=Config.SHEETS_CALL_TIMEOUT_SECONDS)
             return records
+        except executors.ExecutorBusy:
+            raise
         except Exception as e:
-            print(f"Error fetching data from Google Sheets: {e}")
+            logger.error("Ошибка загрузки таблицы пользователей", extra={'error': str(e)})
             return None
 
+    def _load_users(self):
+        """Загружает таблицу пользователей в словарь {логин: [записи]}. False при ошибке"""
+        users_data = self._fetch_users_data()
+        if users_data is None:
+            return False
+
+        users = {}
+        for user in users_data:
+            # Логин может повторяться (например, новый пароль во второй строке):
+            # вход проверяется по всем строкам логина в порядке таблицы
+            users.setdefault(user.get('Login'), []).append(user)
+
+        with self.users_lock:
+            self.users = users
+            self.users_loaded_at = time.monotonic()
+        return True
+
+    def _refresh_in_background(self):
+        """Обновляет кэш в отдельном потоке; параллельно идет не больше одного обновления"""
+        with self.users_lock:
+            if self.refreshing:
+                return
+            self.refreshing = True
+
+        def refresh():
+            try:
+                self._load_users()
+            finally:
+                with self.users_lock:
+                    self.refreshing = False
+
+        try:
+            executors.get('sheets').submit(refresh)
+        except executors.ExecutorBusy:
+            # Пул занят: обновим при следующем входе, пока работает устаревший кэш
+            with self.users_lock:
+                self.refreshing = False
+
+    def _get_users(self):
+        """Кэш пользователей с TTL.
+
+        Устаревший кэш отдается сразу, а обновление идет в фоне (stale-while-revalidate):
+        если Google Sheets недоступен, вход продолжает работать по последним данным.
+        Синхронная загрузка — только когда кэша еще нет.
+        """
+        with self.users_lock:
+            users = self.users
+            age = time.monotonic() - self.users_loaded_at
+
+        if users is None:
+            if not self._load_users():
+                return None
+            return self.users
+
+        if age > Config.USERS_CACHE_TTL_SECONDS:
+            self._refresh_in_background()
+        return users
+
+    def invalidate_users(self):
+        """Сбрасывает кэш: следующий вход заново загрузит таблицу пользователей"""
+        with self.users_lock:
+            self.users = None
+            self.users_loaded_at = 0
+
+    @metrics.timed_function('auth', 'authenticate')
     def authenticate_user(self, login, password):
         # ⚠️ Обновляем сообщение об ошибке, если клиент не был инициализирован
-        if not self.client:
+        if not self._connect():
             return {"success": False, "error": "Ошибка подключения к Google Sheets. Проверьте секреты Replit."}
 
-        users_data = self._fetch_users_data()
-        if users_data is None:
+        users = self._get_users()
+        if users is None:
              return {"success": False, "error": "Не удалось загрузить данные пользователей."}
-        print(f"Loaded users data: {users_data}")
 
-        for user in users_data:
-            # Проверка соответствия ключей заголовкам в вашей таблице
-            user_login = user.get('Login') 
-            user_password = user.get('Password')
+        # Проверка соответствия ключей заголовкам в вашей таблице
+        user = next((row for row in users.get(login, ()) if row.get('Password') == password), None)
+        if user is not None:
             expiry_date_str = user.get('Expiration Date')
-            
-            if user_login == login and user_password == password:
-                # Проверка срока действия
-                days_left = None
-                try:
-                    expiry_date = datetime.strptime(expiry_date_str, '%Y-%m-%d').date()
-                    today = datetime.now().date()
-                    
-                    if today > expiry_date:
-                        return {"success": False, "error": f"Срок действия учетной записи истек ({expiry_date_str})."}
-                    
-                    days_left = (expiry_date - today).days
-
-                except (ValueError, TypeError):
-                    # Если формат даты неверен или отсутствует, считаем бессрочным
-                    days_left = "Бессрочно"
-
-                return {"success": True, "login": login, "days_left": days_left}
+
+            # Проверка срока действия
+            days_left = None
+            try:
+                expiry_date = datetime.strptime(expiry_date_str, '%Y-%m-%d').date()
+                today = datetime.now().date()
+                
+                if today > expiry_date:
+                    return {"success": False, "error": f"Срок действия учетной записи истек ({expiry_date_str})."}
+                
+                days_left = (expiry_date - today).days
+
+            except (ValueError, TypeError):
+                # Если формат даты неверен или отсутствует, считаем бессрочным
+                days_left = "Бессрочно"
+
+            return {"success": True, "login": login, "days_left": days_left}
         
         return {"success": False, "error": "Неверный логин или пароль"}
 
@@ -123,6 +220,6 @@ def login_required(f):
         # Проверяем, есть ли пользователь в сессии
         if session.get('logged_in') != True:
             # Сохраняем запрошенный URL для перенаправления после входа
-            return redirect(url_for('login', next=request.url))
+            return redirect(url_for('main.login', next=request.url))
         return f(*args, **kwargs)
     return decorated_function
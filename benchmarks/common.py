@@ -0,0 +1,120 @@
+"""
+Общие части бенчмарков и нагрузочных тестов: изолированное окружение,
+заглушка Google Sheets и генерация синтетических PDF и шаблонов.
+"""
+
+import os
+import sys
+import random
+import tempfile
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+from config import Config
+
+CLASSES = ["5А", "5Б", "6А", "6Б", "7А", "7Б", "8А", "8Б", "9А", "9Б", "10А", "11А"]
+
+
+def isolate(workdir=None):
+    """Переключает все папки и базы приложения во временный каталог.
+
+    Вызывать до импорта app: данные проекта не меняются, Google API не вызывается
+    (учетные данные из окружения и credentials/ не используются).
+    """
+    workdir = workdir or tempfile.mkdtemp(prefix="pdftest_bench_")
+    Config.UPLOAD_FOLDER = os.path.join(workdir, "uploads")
+    Config.TEMPLATES_FOLDER = os.path.join(workdir, "templates_json")
+    Config.CREDENTIALS_FOLDER = os.path.join(workdir, "credentials")
+    Config.RENDER_CACHE_FOLDER = os.path.join(Config.UPLOAD_FOLDER, ".render_cache")
+    Config.PAGE_CACHE_FOLDER = os.path.join(Config.UPLOAD_FOLDER, ".page_cache")
+    Config.UPLOAD_JOBS_FOLDER = os.path.join(Config.UPLOAD_FOLDER, ".jobs")
+    Config.TEMPLATE_INDEX_PATH = os.path.join(workdir, "templates_index.json")
+    Config.RESULT_STORE_PATH = os.path.join(workdir, "results.sqlite3")
+    for folder in (Config.UPLOAD_FOLDER, Config.TEMPLATES_FOLDER, Config.CREDENTIALS_FOLDER):
+        os.makedirs(folder, exist_ok=True)
+    os.environ.pop("client_email", None)
+    return workdir
+
+
+def percentile(samples, fraction):
+    """Перцентиль (0.95 = p95) по ближайшему рангу"""
+    ordered = sorted(samples)
+    index = min(int(round(fraction * (len(ordered) - 1))), len(ordered) - 1)
+    return ordered[index]
+
+
+def stub_sheets():
+    """Запись в Google Sheets без сети: append_results сразу сообщает об успехе"""
+    import sheets_utils
+
+    def append_results(sheet_url, question_headers, rows):
+        return {"success": True, "message": f"Добавлено {len(rows)} строк", "headers": question_headers}
+
+    sheets_utils.append_results = append_results
+
+
+def login(client, login='bench'):
+    """Сессия вошедшего пользователя (как после /login) для тестового клиента Flask"""
+    with client.session_transaction() as session:
+        session['logged_in'] = True
+        session['login'] = login
+
+
+def make_pdf(pages, seed=0):
+    """PDF из pages страниц A4 с текстом и рамками ответов; seed меняет содержимое (и хэш)"""
+    import fitz
+
+    rng = random.Random(seed)
+    doc = fitz.open()
+    for number in range(pages):
+        page = doc.new_page(width=595, height=842)
+        page.insert_text((72, 60), f"Контрольная работа, вариант {seed}, стр. {number + 1}", fontsize=14)
+        for row in range(20):
+            y = 100 + row * 35
+            page.insert_text((72, y), f"{row + 1}. Вопрос {rng.randint(1, 10 ** 6)}", fontsize=11)
+            page.draw_rect(fitz.Rect(380, y - 14, 540, y + 8), color=(0, 0, 0), width=0.8)
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+
+def make_template(template_id, fields, pages=1, seed=0):
+    """Шаблон с fields полями; варианты ответа — короткие слова и числа"""
+    rng = random.Random(seed)
+    template_fields = []
+    for number in range(fields):
+        variants = [f"ответ{number}"] if number % 3 else [str(rng.randint(1, 1000))]
+        if number % 5 == 0:
+            variants.append(f"вариант {number}")
+        template_fields.append({
+            "id": f"field_{number % pages}_{number + 1}",
+            "page": number % pages,
+            "x": rng.uniform(50, 1500),
+            "y": rng.uniform(50, 2200),
+            "w": rng.uniform(60, 400),
+            "h": rng.uniform(25, 50),
+            "variants": variants,
+            "checkable": True
+        })
+    return {
+        "template_id": template_id,
+        "name": f"Шаблон {template_id}",
+        "files": [f"{template_id}_page_{page + 1}.png" for page in range(pages)],
+        "fields": template_fields,
+        "sheet_url": "",
+        "classes": rng.sample(CLASSES, 2)
+    }
+
+
+def make_answers(template, correct_ratio=0.7, seed=0):
+    """Ответы ученика: доля correct_ratio правильных, остальные неверные или пустые"""
+    rng = random.Random(seed)
+    answers = {}
+    for field in template["fields"]:
+        if rng.random() < correct_ratio:
+            answers[field["id"]] = rng.choice(field["variants"]).upper()
+        else:
+            answers[field["id"]] = rng.choice(["", "не знаю", "42"])
+    return answers
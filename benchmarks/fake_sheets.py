@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Локальная замена Google Sheets API v4 для нагрузочных тестов.
+
+Поддерживает запросы, которые делает приложение через gspread: метаданные таблицы,
+добавление листа (batchUpdate/addSheet), чтение диапазона и append. Таблицы
+создаются при первом обращении и живут в памяти. Можно задать задержку ответа
+и долю ошибок 429 (превышение квоты).
+
+    python benchmarks/fake_sheets.py --port 8765 --latency-ms 200 --error-rate 0.05
+    SHEETS_API_ENDPOINT=http://127.0.0.1:8765 python app.py
+
+Таблица пользователей (Config.USERS_SHEET_URL) заполняется логинами
+teacher / student1..N (пароль совпадает с логином, см. --users).
+"""
+
+import re
+import json
+import time
+import random
+import argparse
+import threading
+from urllib.parse import urlsplit, unquote
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+SPREADSHEET_RE = re.compile(r'^/v4/spreadsheets/([^/:]+)(.*)$')
+ROWS_RANGE_RE = re.compile(r'^[A-Z]*(\d+):[A-Z]*(\d+)$')
+USERS_HEADER = ["Login", "Password", "Expiration Date"]
+
+
+class FakeSheets:
+    """Состояние таблиц и настройки имитации (задержка, ошибки)"""
+
+    def __init__(self, latency_ms=0, jitter_ms=0, error_rate=0.0, seed=None):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.spreadsheets = {}
+        self.stats = {'requests': 0, 'errors_injected': 0, 'rows_appended': 0, 'by_kind': {}}
+
+    def spreadsheet(self, spreadsheet_id):
+        with self.lock:
+            if spreadsheet_id not in self.spreadsheets:
+                self.spreadsheets[spreadsheet_id] = {
+                    'title': f"Таблица {spreadsheet_id}",
+                    'sheets': [{'sheetId': 0, 'title': 'Лист1', 'rows': []}]
+                }
+            return self.spreadsheets[spreadsheet_id]
+
+    def add_users(self, spreadsheet_id, count):
+        """Заполняет первый лист таблицей пользователей для AuthManager"""
+        rows = [USERS_HEADER, ["teacher", "teacher", ""]]
+        rows += [[f"student{i}", f"student{i}", ""] for i in range(1, count + 1)]
+        self.spreadsheet(spreadsheet_id)['sheets'][0]['rows'] = rows
+
+    def count(self, kind):
+        with self.lock:
+            self.stats['requests'] += 1
+            self.stats['by_kind'][kind] = self.stats['by_kind'].get(kind, 0) + 1
+
+    def snapshot(self):
+        with self.lock:
+            return json.loads(json.dumps(self.stats))
+
+
+def _sheet_properties(sheet, index):
+    rows = len(sheet['rows'])
+    columns = max((len(row) for row in sheet['rows']), default=0)
+    return {
+        'sheetId': sheet['sheetId'],
+        'title': sheet['title'],
+        'index': index,
+        'sheetType': 'GRID',
+        'gridProperties': {'rowCount': max(rows, 1000), 'columnCount': max(columns, 26)}
+    }
+
+
+def _split_range(value):
+    """'Лист'!A1:1 -> ('Лист', 'A1:1')"""
+    value = unquote(value)
+    if '!' in value:
+        title, cells = value.rsplit('!', 1)
+    else:
+        title, cells = value, ''
+    if title.startswith("'") and title.endswith("'"):
+        title = title[1:-1].replace("''", "'")
+    return title, cells
+
+
+class Handler(BaseHTTPRequestHandler):
+    server_version = "FakeSheets/1.0"
+    protocol_version = "HTTP/1.1"
+
+    @property
+    def fake(self):
+        return self.server.fake
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=UTF-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return json.loads(self.rfile.read(length) or b'{}')
+
+    def _simulate(self, kind):
+        """Задержка и случайная ошибка квоты. True, если ответ уже отправлен"""
+        fake = self.fake
+        fake.count(kind)
+        delay = fake.latency_ms + (fake.random.uniform(0, fake.jitter_ms) if fake.jitter_ms else 0)
+        if delay:
+            time.sleep(delay / 1000)
+        if fake.error_rate and fake.random.random() < fake.error_rate:
+            with fake.lock:
+                fake.stats['errors_injected'] += 1
+            self._send(429, {'error': {
+                'code': 429,
+                'message': "Quota exceeded for quota metric 'Write requests'",
+                'status': 'RESOURCE_EXHAUSTED'
+            }})
+            return True
+        return False
+
+    def _find_sheet(self, spreadsheet, title):
+        for sheet in spreadsheet['sheets']:
+            if sheet['title'] == title:
+                return sheet
+        return None
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        if url.path == '/_stats':
+            return self._send(200, self.fake.snapshot())
+
+        match = SPREADSHEET_RE.match(url.path)
+        if not match:
+            return self._send(404, {'error': {'code': 404, 'message': 'Not found', 'status': 'NOT_FOUND'}})
+        spreadsheet_id, rest = match.groups()
+        spreadsheet = self.fake.spreadsheet(spreadsheet_id)
+
+        if rest == '':
+            if self._simulate('metadata'):
+                return
+            with self.fake.lock:
+                sheets = [{'properties': _sheet_properties(s, i)} for i, s in enumerate(spreadsheet['sheets'])]
+            return self._send(200, {
+                'spreadsheetId': spreadsheet_id,
+                'properties': {'title': spreadsheet['title'], 'locale': 'ru_RU', 'timeZone': 'Europe/Moscow'},
+                'sheets': sheets
+            })
+
+        if rest.startswith('/values/'):
+            if self._simulate('values_get'):
+                return
+            title, cells = _split_range(rest[len('/values/'):])
+            with self.fake.lock:
+                sheet = self._find_sheet(spreadsheet, title)
+                if sheet is None:
+                    return self._send(400, {'error': {'code': 400, 'message': f'Unable to parse range: {title}',
+                                                      'status': 'INVALID_ARGUMENT'}})
+                rows = sheet['rows']
+                rows_range = ROWS_RANGE_RE.match(cells)
+                if rows_range:
+                    first, last = map(int, rows_range.groups())
+                    rows = rows[first - 1:last]
+                values = [list(row) for row in rows]
+            payload = {'range': f"'{title}'!{cells or 'A1:Z'}", 'majorDimension': 'ROWS'}
+            if values:
+                payload['values'] = values
+            return self._send(200, payload)
+
+        return self._send(404, {'error': {'code': 404, 'message': 'Not found', 'status': 'NOT_FOUND'}})
+
+    def do_POST(self):
+        url = urlsplit(self.path)
+        match = SPREADSHEET_RE.match(url.path)
+        if not match:
+            return self._send(404, {'error': {'code': 404, 'message': 'Not found', 'status': 'NOT_FOUND'}})
+        spreadsheet_id, rest = match.groups()
+        spreadsheet = self.fake.spreadsheet(spreadsheet_id)
+        body = self._body()
+
+        if rest == ':batchUpdate':
+            if self._simulate('batch_update'):
+                return
+            replies = []
+            with self.fake.lock:
+                for request in body.get('requests', []):
+                    properties = request.get('addSheet', {}).get('properties')
+                    if properties is None:
+                        replies.append({})
+                        continue
+                    sheet = {
+                        'sheetId': max(s['sheetId'] for s in spreadsheet['sheets']) + 1,
+                        'title': properties['title'],
+                        'rows': []
+                    }
+                    spreadsheet['sheets'].append(sheet)
+                    replies.append({'addSheet': {
+                        'properties': _sheet_properties(sheet, len(spreadsheet['sheets']) - 1)
+                    }})
+            return self._send(200, {'spreadsheetId': spreadsheet_id, 'replies': replies})
+
+        if rest.startswith('/values/') and rest.endswith(':append'):
+            if self._simulate('append'):
+                return
+            title, _ = _split_range(rest[len('/values/'):-len(':append')])
+            values = body.get('values', [])
+            with self.fake.lock:
+                sheet = self._find_sheet(spreadsheet, title)
+                if sheet is None:
+                    return self._send(400, {'error': {'code': 400, 'message': f'Unable to parse range: {title}',
+                                                      'status': 'INVALID_ARGUMENT'}})
+                start = len(sheet['rows']) + 1
+                sheet['rows'].extend(values)
+                self.fake.stats['rows_appended'] += len(values)
+            return self._send(200, {
+                'spreadsheetId': spreadsheet_id,
+                'tableRange': f"'{title}'!A1",
+                'updates': {
+                    'spreadsheetId': spreadsheet_id,
+                    'updatedRange': f"'{title}'!A{start}:A{start + len(values) - 1}",
+                    'updatedRows': len(values),
+                    'updatedCells': sum(len(row) for row in values)
+                }
+            })
+
+        return self._send(404, {'error': {'code': 404, 'message': 'Not found', 'status': 'NOT_FOUND'}})
+
+
+def spreadsheet_id_from_url(url):
+    match = re.search(r'/spreadsheets/d/([a-zA-Z0-9-_]+)', url)
+    return match.group(1) if match else None
+
+
+def start_server(fake, host='127.0.0.1', port=0):
+    """Запускает сервер в фоновом потоке. Возвращает (server, 'http://host:port')"""
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    server.fake = fake
+    threading.Thread(target=server.serve_forever, name="fake-sheets", daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def main():
+    # Импорт ради побочного эффекта: common добавляет корень проекта в sys.path для config
+    import common  # noqa: F401
+    from config import Config
+
+    parser = argparse.ArgumentParser(description="Локальная замена Google Sheets API")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency-ms', type=float, default=0, help="задержка каждого ответа")
+    parser.add_argument('--jitter-ms', type=float, default=0, help="случайная добавка к задержке (0..jitter)")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="доля ответов 429 (0.05 = 5%%)")
+    parser.add_argument('--users', type=int, default=300, help="число учеников в таблице пользователей")
+    args = parser.parse_args()
+
+    fake = FakeSheets(args.latency_ms, args.jitter_ms, args.error_rate)
+    fake.add_users(spreadsheet_id_from_url(Config.USERS_SHEET_URL), args.users)
+    server, url = start_server(fake, args.host, args.port)
+    print(f"Google Sheets API (замена): {url}  (статистика: {url}/_stats)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,338 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Нагрузочный тест «урок в классе»: сколько учеников одновременно выдерживает один
+экземпляр приложения, прежде чем /check_answers начинает тормозить.
+
+Сценарий:
+  1. учитель входит, загружает PDF и сохраняет шаблон с таблицей результатов;
+  2. ученики (--students, 30-300) одновременно открывают /student, classes.json,
+     /load_template и изображения страниц;
+  3. все ученики разом отправляют /check_answers (--rounds раз), а учитель в это
+     время загружает новые PDF (--teacher-uploads).
+
+По умолчанию приложение и замена Google Sheets API (fake_sheets.py) запускаются
+в этом же процессе во временном каталоге; задержка и ошибки квоты Sheets задаются
+параметрами --sheets-latency-ms и --sheets-error-rate. С --target нагрузка идет на
+уже запущенный сервер (его нужно запустить с SHEETS_API_ENDPOINT на fake_sheets.py).
+
+    python benchmarks/loadtest.py --students 100 --fields 40 --sheets-latency-ms 300
+    python benchmarks/loadtest.py --students 300 --sheets-error-rate 0.1 --output report.json
+
+Итог — p50/p95/p99 задержки и пропускная способность по каждому маршруту.
+"""
+
+import re
+import sys
+import json
+import time
+import random
+import logging
+import argparse
+import threading
+from datetime import datetime
+
+import requests
+
+import common
+import fake_sheets
+
+RESULTS_SHEET_URL = "https://docs.google.com/spreadsheets/d/loadtest_results/edit"
+# Фоновая конвертация (UPLOAD_ASYNC, включена в продакшене): опрос /upload_status
+UPLOAD_POLL_INTERVAL_SECONDS = 0.5
+UPLOAD_POLL_TIMEOUT_SECONDS = 600
+
+# /load_template/tpl_1 -> /load_template/<id>
+ROUTE_PATTERNS = [
+    (re.compile(r'^/load_template/[^/]+$'), '/load_template/<id>'),
+    (re.compile(r'^/uploads/[^/]+$'), '/uploads/<file>'),
+    (re.compile(r'^/upload_status/[^/]+$'), '/upload_status/<job_id>'),
+]
+
+
+def route_label(method, path):
+    for pattern, label in ROUTE_PATTERNS:
+        if pattern.match(path):
+            path = label
+            break
+    return f"{method} {path}"
+
+
+class Recorder:
+    """Задержки и статусы ответов по маршрутам"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.routes = {}
+
+    def add(self, label, started, finished, status):
+        with self.lock:
+            route = self.routes.setdefault(label, {'latencies': [], 'errors': 0, 'first': started, 'last': finished})
+            route['latencies'].append((finished - started) * 1000)
+            if status is None or status >= 400:
+                route['errors'] += 1
+            route['first'] = min(route['first'], started)
+            route['last'] = max(route['last'], finished)
+
+    def report(self):
+        report = {}
+        for label, route in sorted(self.routes.items()):
+            latencies = route['latencies']
+            window = max(route['last'] - route['first'], 1e-9)
+            report[label] = {
+                'requests': len(latencies),
+                'errors': route['errors'],
+                'p50_ms': round(common.percentile(latencies, 0.50), 1),
+                'p95_ms': round(common.percentile(latencies, 0.95), 1),
+                'p99_ms': round(common.percentile(latencies, 0.99), 1),
+                'max_ms': round(max(latencies), 1),
+                'throughput_rps': round(len(latencies) / window, 1),
+            }
+        return report
+
+
+class Client:
+    """HTTP сессия одного пользователя с записью каждой операции в Recorder"""
+
+    def __init__(self, base_url, recorder, timeout):
+        self.base_url = base_url
+        self.recorder = recorder
+        self.timeout = timeout
+        self.session = requests.Session()
+
+    def request(self, method, path, **kwargs):
+        started = time.perf_counter()
+        status = None
+        try:
+            response = self.session.request(method, self.base_url + path, timeout=self.timeout,
+                                            allow_redirects=False, **kwargs)
+            status = response.status_code
+            return response
+        except requests.RequestException:
+            return None
+        finally:
+            self.recorder.add(route_label(method, path.split('?', 1)[0]), started, time.perf_counter(), status)
+
+
+# ==============================================================================
+# Сценарий
+# ==============================================================================
+
+def teacher_login(client, login, password):
+    response = client.request('POST', '/login', data={'login': login, 'password': password})
+    if response is None or response.status_code != 302:
+        raise RuntimeError("Учитель не смог войти (проверьте таблицу пользователей и SHEETS_API_ENDPOINT)")
+
+
+def upload_pdf(client, pages, seed):
+    """Загрузка PDF; при фоновой конвертации (202) ждет готовности задачи. None при ошибке"""
+    pdf = common.make_pdf(pages, seed=seed)
+    response = client.request('POST', '/upload', files={'file': (f'loadtest_{seed}.pdf', pdf, 'application/pdf')})
+    if response is None or response.status_code not in (200, 202):
+        return None
+    result = response.json()
+    if response.status_code == 200:
+        return result
+
+    deadline = time.monotonic() + UPLOAD_POLL_TIMEOUT_SECONDS
+    while time.monotonic() < deadline:
+        time.sleep(UPLOAD_POLL_INTERVAL_SECONDS)
+        response = client.request('GET', result['status_url'])
+        if response is None or response.status_code != 200:
+            return None
+        status = response.json()
+        if status['status'] == 'done':
+            return status
+        if status['status'] == 'error':
+            return None
+    return None
+
+
+def prepare_template(client, args):
+    """Загружает PDF и сохраняет шаблон, по которому ученики будут сдавать работы"""
+    uploaded = upload_pdf(client, args.pages, seed=random.randrange(10 ** 9))
+    if not uploaded:
+        raise RuntimeError("Не удалось загрузить PDF для шаблона")
+
+    template = common.make_template(f"loadtest_{int(time.time())}", args.fields, pages=args.pages)
+    template.update({
+        'files': uploaded['files'],
+        'images_data': uploaded['images_data'],
+        'sheet_url': RESULTS_SHEET_URL,
+    })
+    response = client.request('POST', '/save_template', json=template)
+    if response is None or not response.json().get('success'):
+        raise RuntimeError("Не удалось сохранить шаблон")
+    return template
+
+
+def student_session(number, args, base_url, recorder, template, barriers):
+    client = Client(base_url, recorder, args.timeout)
+    rng = random.Random(number)
+
+    # Открытие страницы теста
+    client.request('GET', '/student')
+    client.request('GET', '/static/classes.json')
+    response = client.request('GET', f"/load_template/{template['template_id']}")
+    loaded = response.json() if response is not None and response.status_code == 200 else template
+    for item in loaded.get('images_data') or []:
+        query = f"?size={args.image_size}" if args.image_size else ''
+        if item.get('version'):
+            query += ('&' if query else '?') + f"v={item['version']}"
+        client.request('GET', f"/uploads/{item['filename']}{query}")
+
+    for round_number in range(args.rounds):
+        # Ученики сдают работы одновременно (с небольшим разбросом); первую волну
+        # начинают вместе с загрузками учителя
+        barriers[0 if round_number == 0 else 1].wait()
+        if args.spread_seconds:
+            time.sleep(rng.uniform(0, args.spread_seconds))
+        answers = common.make_answers(template, correct_ratio=rng.uniform(0.3, 1.0), seed=number * 1000 + round_number)
+        client.request('POST', '/check_answers', json={
+            'template_id': template['template_id'],
+            'answers': answers,
+            'student_info': {'name': f"Ученик {number}", 'class': '8А'},
+            'sheet_url': RESULTS_SHEET_URL,
+        })
+
+
+def teacher_uploads(teacher, args, barrier):
+    barrier.wait()
+    for number in range(args.teacher_uploads):
+        upload_pdf(teacher, args.upload_pages, seed=random.randrange(10 ** 9))
+
+
+def run_scenario(args, base_url, recorder):
+    teacher = Client(base_url, recorder, args.timeout)
+    teacher_login(teacher, args.login, args.password)
+    template = prepare_template(teacher, args)
+
+    # Первая волна сдачи: все ученики + поток загрузок учителя; следующие — только ученики
+    barriers = (
+        threading.Barrier(args.students + (1 if args.teacher_uploads else 0)),
+        threading.Barrier(args.students)
+    )
+    threads = [
+        threading.Thread(target=student_session, args=(n, args, base_url, recorder, template, barriers), daemon=True)
+        for n in range(1, args.students + 1)
+    ]
+    if args.teacher_uploads:
+        threads.append(threading.Thread(target=teacher_uploads, args=(teacher, args, barriers[0]), daemon=True))
+
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return teacher, time.perf_counter() - started
+
+
+# ==============================================================================
+# Запуск
+# ==============================================================================
+
+def start_local_app(args):
+    """Приложение и замена Sheets API в этом процессе. Возвращает (base_url, fake, result_store)"""
+    from werkzeug.serving import make_server
+
+    workdir = common.isolate()
+    fake = fake_sheets.FakeSheets(args.sheets_latency_ms, args.sheets_jitter_ms, args.sheets_error_rate, seed=1)
+    fake.add_users(fake_sheets.spreadsheet_id_from_url(common.Config.USERS_SHEET_URL), args.students)
+    _, sheets_url = fake_sheets.start_server(fake)
+    common.Config.SHEETS_API_ENDPOINT = sheets_url
+
+    # Импорт приложения только после переключения папок и адреса Sheets API
+    from app import create_app
+    import result_store
+
+    app = create_app()
+
+    # Журнал каждого запроса werkzeug только мешает читать итог
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, name="app-server", daemon=True).start()
+    print(f"Приложение: http://127.0.0.1:{server.server_port}  Sheets API: {sheets_url}  данные: {workdir}")
+    return f"http://127.0.0.1:{server.server_port}", fake, result_store
+
+
+def wait_for_sync(result_store, timeout):
+    """Ждет, пока outbox отправит все результаты в Sheets. Возвращает (секунды, осталось)"""
+    started = time.perf_counter()
+    pending = result_store.pending_count()
+    while pending and time.perf_counter() - started < timeout:
+        time.sleep(0.5)
+        pending = result_store.pending_count()
+    return time.perf_counter() - started, pending
+
+
+def print_report(report):
+    print(f"\n{'Маршрут':<32} {'запросов':>8} {'ошибок':>7} {'p50, мс':>9} {'p95, мс':>9} "
+          f"{'p99, мс':>9} {'max, мс':>9} {'запр/с':>8}")
+    for label, route in report.items():
+        print(f"{label:<32} {route['requests']:>8} {route['errors']:>7} {route['p50_ms']:>9.1f} "
+              f"{route['p95_ms']:>9.1f} {route['p99_ms']:>9.1f} {route['max_ms']:>9.1f} {route['throughput_rps']:>8.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный тест урока: ученики и учитель одновременно")
+    parser.add_argument('--students', type=int, default=60, help="учеников одновременно (30-300)")
+    parser.add_argument('--rounds', type=int, default=1, help="сколько раз каждый ученик сдает работу")
+    parser.add_argument('--spread-seconds', type=float, default=0.5, help="разброс момента сдачи")
+    parser.add_argument('--fields', type=int, default=30, help="полей в шаблоне")
+    parser.add_argument('--pages', type=int, default=2, help="страниц в PDF шаблона")
+    parser.add_argument('--image-size', default='screen', help="вариант изображения страницы ('' — полный)")
+    parser.add_argument('--teacher-uploads', type=int, default=2, help="загрузок PDF учителем во время сдачи")
+    parser.add_argument('--upload-pages', type=int, default=5, help="страниц в загружаемых учителем PDF")
+    parser.add_argument('--sheets-latency-ms', type=float, default=150, help="задержка ответа Sheets API")
+    parser.add_argument('--sheets-jitter-ms', type=float, default=100, help="случайная добавка к задержке")
+    parser.add_argument('--sheets-error-rate', type=float, default=0.0, help="доля ответов 429 от Sheets API")
+    parser.add_argument('--sync-timeout', type=float, default=120, help="сколько ждать отправки результатов в Sheets")
+    parser.add_argument('--target', help="URL уже запущенного приложения (иначе запуск в этом процессе)")
+    parser.add_argument('--login', default='teacher', help="логин учителя")
+    parser.add_argument('--password', default='teacher', help="пароль учителя")
+    parser.add_argument('--timeout', type=float, default=120, help="таймаут одного запроса, с")
+    parser.add_argument('--output', help="сохранить отчет в JSON")
+    args = parser.parse_args()
+
+    fake = result_store = None
+    if args.target:
+        base_url = args.target.rstrip('/')
+    else:
+        base_url, fake, result_store = start_local_app(args)
+
+    recorder = Recorder()
+    teacher, duration = run_scenario(args, base_url, recorder)
+    report = recorder.report()
+    print_report(report)
+    print(f"\nСценарий: {duration:.1f} с, учеников {args.students}, сдач {args.students * args.rounds}")
+
+    summary = {
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'settings': vars(args),
+        'duration_seconds': round(duration, 2),
+        'routes': report,
+    }
+
+    if result_store is not None:
+        sync_seconds, pending = wait_for_sync(result_store, args.sync_timeout)
+        summary['sheets_sync'] = {'seconds': round(sync_seconds, 2), 'pending': pending}
+        print(f"Отправка в Sheets: {sync_seconds:.1f} с после сценария, не отправлено {pending}")
+    if fake is not None:
+        summary['sheets_api'] = fake.snapshot()
+        print(f"Sheets API: {json.dumps(summary['sheets_api'], ensure_ascii=False)}")
+    else:
+        response = teacher.request('GET', '/cache_stats')
+        if response is not None and response.status_code == 200:
+            summary['server_stats'] = response.json()
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+        print(f"Отчет: {args.output}")
+
+    errors = sum(route['errors'] for route in report.values())
+    return 1 if errors else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Бенчмарки горячих путей сервера через тестовый клиент Flask:
+конвертация PDF (/upload), проверка ответов (/check_answers),
+список и загрузка шаблонов (/list_templates, /load_template).
+
+Данные синтетические (см. common.py), Google Sheets заменен заглушкой,
+все файлы создаются во временном каталоге.
+
+    python benchmarks/run_benchmarks.py                       # полный набор
+    python benchmarks/run_benchmarks.py --quick               # быстрый прогон
+    python benchmarks/run_benchmarks.py --only check_answers  # только часть
+    python benchmarks/run_benchmarks.py --baseline benchmarks/results/base.json
+
+Результаты пишутся в JSON (по умолчанию benchmarks/results/<дата>.json).
+С --baseline медианы сравниваются с прошлым прогоном; если какой-то случай
+стал медленнее больше чем на --threshold, код выхода 1.
+"""
+
+import os
+import io
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import statistics
+import subprocess
+from datetime import datetime
+
+import common
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+# Размеры синтетических данных: (полный прогон, --quick)
+MATRIX = {
+    'upload_pages': ([1, 10, 50], [1, 5]),
+    'upload_dpi': ([100, 200], [100]),
+    'check_answers_fields': ([10, 100, 500], [10, 100]),
+    'list_templates_count': ([1, 100, 1000], [1, 100]),
+}
+
+
+def measure(name, params, iterations, func, warmup=1):
+    """Запускает func iterations раз и возвращает статистику в миллисекундах"""
+    for _ in range(warmup):
+        func()
+
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+
+    result = {
+        'name': name,
+        'params': params,
+        'iterations': iterations,
+        'min_ms': round(min(samples), 3),
+        'median_ms': round(statistics.median(samples), 3),
+        'mean_ms': round(statistics.fmean(samples), 3),
+        'p95_ms': round(common.percentile(samples, 0.95), 3),
+    }
+    print(f"  {name:<22} {json.dumps(params, ensure_ascii=False):<40} "
+          f"медиана {result['median_ms']:>9.2f} мс  p95 {result['p95_ms']:>9.2f} мс")
+    return result
+
+
+def expect_ok(response):
+    if response.status_code >= 400:
+        raise RuntimeError(f"{response.request.path}: HTTP {response.status_code} {response.get_data(as_text=True)[:200]}")
+    return response
+
+
+# ==============================================================================
+# Случаи
+# ==============================================================================
+
+def bench_upload(client, quick, iterations):
+    from config import Config
+
+    page_counts = MATRIX['upload_pages'][1] if quick else MATRIX['upload_pages'][0]
+    dpis = MATRIX['upload_dpi'][1] if quick else MATRIX['upload_dpi'][0]
+    original_dpi = Config.PDF_DPI
+    results = []
+    try:
+        for dpi in dpis:
+            Config.PDF_DPI = dpi
+            for pages in page_counts:
+                # Большие документы конвертируются долго — меньше повторов
+                runs = max(1, iterations // max(1, pages // 5))
+                # Каждый повтор — новый PDF, чтобы не попадать в кэш рендеринга
+                pdfs = iter([common.make_pdf(pages, seed=seed) for seed in range(runs + 1)])
+
+                def upload():
+                    expect_ok(client.post('/upload', data={'file': (io.BytesIO(next(pdfs)), 'bench.pdf')},
+                                          content_type='multipart/form-data'))
+
+                results.append(measure('upload', {'pages': pages, 'dpi': dpi}, runs, upload))
+
+                # Повторная загрузка того же PDF — попадание в кэш рендеринга
+                cached_pdf = common.make_pdf(pages, seed=-1)
+
+                def upload_cached():
+                    expect_ok(client.post('/upload', data={'file': (io.BytesIO(cached_pdf), 'bench.pdf')},
+                                          content_type='multipart/form-data'))
+
+                results.append(measure('upload_cached', {'pages': pages, 'dpi': dpi}, iterations, upload_cached))
+    finally:
+        Config.PDF_DPI = original_dpi
+    return results
+
+
+def bench_check_answers(client, quick, iterations):
+    import template_store
+
+    results = []
+    field_counts = MATRIX['check_answers_fields'][1] if quick else MATRIX['check_answers_fields'][0]
+    for fields in field_counts:
+        template = common.make_template(f"bench_check_{fields}", fields, pages=max(1, fields // 20))
+        template_store.save_template(template)
+        answers = [common.make_answers(template, seed=seed) for seed in range(10)]
+        counter = iter(range(10 ** 9))
+
+        def check(sheet_url):
+            payload = {
+                'template_id': template['template_id'],
+                'answers': answers[next(counter) % len(answers)],
+                'student_info': {'name': 'Ученик', 'class': '8А'},
+                'sheet_url': sheet_url
+            }
+            expect_ok(client.post('/check_answers', json=payload))
+
+        results.append(measure('check_answers', {'fields': fields}, iterations, lambda: check('')))
+        results.append(measure('check_answers_sheets', {'fields': fields}, iterations,
+                               lambda: check('https://docs.google.com/spreadsheets/d/bench/edit')))
+    return results
+
+
+def bench_templates(client, quick, iterations):
+    from config import Config
+    import template_store
+
+    results = []
+    base_folder = Config.TEMPLATES_FOLDER
+    counts = MATRIX['list_templates_count'][1] if quick else MATRIX['list_templates_count'][0]
+    for count in counts:
+        # Отдельная папка и индекс на каждый размер набора
+        Config.TEMPLATES_FOLDER = os.path.join(base_folder, f"set_{count}")
+        Config.TEMPLATE_INDEX_PATH = os.path.join(base_folder, f"index_{count}.json")
+        os.makedirs(Config.TEMPLATES_FOLDER, exist_ok=True)
+        for number in range(count):
+            template_store.save_template(common.make_template(f"bench_{count}_{number}", 20, seed=number))
+        template_store.rebuild_index()
+
+        params = {'templates': count}
+        results.append(measure('list_templates', params, iterations,
+                               lambda: expect_ok(client.get('/list_templates'))))
+        results.append(measure('list_templates_class', params, iterations,
+                               lambda: expect_ok(client.get('/list_templates?class=8А&per_page=20'))))
+
+        template_id = f"bench_{count}_0"
+        response = expect_ok(client.get(f'/load_template/{template_id}'))
+        etag = response.headers.get('ETag')
+        results.append(measure('load_template', params, iterations,
+                               lambda: expect_ok(client.get(f'/load_template/{template_id}'))))
+        results.append(measure('load_template_304', params, iterations,
+                               lambda: client.get(f'/load_template/{template_id}', headers={'If-None-Match': etag})))
+
+    # Крупный шаблон: разбор и сериализация 500 полей
+    Config.TEMPLATES_FOLDER = base_folder
+    template_store.save_template(common.make_template("bench_large", 500, pages=25))
+    results.append(measure('load_template', {'fields': 500}, iterations,
+                           lambda: expect_ok(client.get('/load_template/bench_large'))))
+    return results
+
+
+BENCHMARKS = {
+    'upload': bench_upload,
+    'check_answers': bench_check_answers,
+    'templates': bench_templates,
+}
+
+
+# ==============================================================================
+# Результаты
+# ==============================================================================
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=common.ROOT_DIR, stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def case_key(result):
+    return f"{result['name']} {json.dumps(result['params'], sort_keys=True)}"
+
+
+def compare(results, baseline_path, threshold):
+    """Печатает сравнение медиан с базовым прогоном. Возвращает число регрессий"""
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = {case_key(r): r for r in json.load(f)['results']}
+
+    regressions = 0
+    print(f"\nСравнение с {baseline_path} (порог {threshold:.0%}):")
+    for result in results:
+        base = baseline.get(case_key(result))
+        if base is None:
+            print(f"  {case_key(result):<60} нет в базовом прогоне")
+            continue
+        ratio = result['median_ms'] / base['median_ms'] if base['median_ms'] else 1.0
+        mark = ''
+        if ratio > 1 + threshold:
+            mark = '  ⚠️ медленнее'
+            regressions += 1
+        elif ratio < 1 - threshold:
+            mark = '  ✅ быстрее'
+        print(f"  {case_key(result):<60} {base['median_ms']:>9.2f} -> {result['median_ms']:>9.2f} мс "
+              f"(x{ratio:.2f}){mark}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарки горячих путей сервера")
+    parser.add_argument('--quick', action='store_true', help="уменьшенный набор данных")
+    parser.add_argument('--iterations', type=int, default=20, help="повторов на случай (по умолчанию 20)")
+    parser.add_argument('--only', action='append', choices=sorted(BENCHMARKS), help="запустить только эти группы")
+    parser.add_argument('--output', help="файл результатов (по умолчанию benchmarks/results/<дата>.json)")
+    parser.add_argument('--baseline', help="JSON прошлого прогона для сравнения")
+    parser.add_argument('--threshold', type=float, default=0.1, help="допустимое замедление медианы (0.1 = 10%%)")
+    parser.add_argument('--keep', action='store_true', help="не удалять временный каталог")
+    args = parser.parse_args()
+
+    workdir = common.isolate()
+    # Импорт приложения только после переключения папок
+    from app import create_app
+    common.stub_sheets()
+
+    client = create_app().test_client()
+    common.login(client)
+
+    results = []
+    started = time.perf_counter()
+    try:
+        for group in args.only or BENCHMARKS:
+            print(f"\n[{group}]")
+            results.extend(BENCHMARKS[group](client, args.quick, args.iterations))
+    finally:
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'quick': args.quick,
+        'iterations': args.iterations,
+        'duration_seconds': round(time.perf_counter() - started, 1),
+        'results': results,
+    }
+
+    output = args.output or os.path.join(RESULTS_DIR, f"{datetime.now():%Y%m%d_%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\nРезультаты: {output}")
+
+    if args.baseline:
+        regressions = compare(results, args.baseline, args.threshold)
+        if regressions:
+            print(f"\n⚠️ Регрессий: {regressions}")
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,67 @@
+import threading
+from collections import OrderedDict
+
+
+class LRUCache:
+    """Потокобезопасный LRU кэш в памяти с ограничением по суммарному размеру значений.
+
+    size_of(value) задает «вес» значения (по умолчанию 1, т.е. ограничение по количеству).
+    """
+
+    def __init__(self, max_size, size_of=None):
+        self.max_size = max_size
+        self.size_of = size_of or (lambda value: 1)
+        self.data = OrderedDict()
+        self.sizes = {}
+        self.total = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            if key in self.data:
+                self.data.move_to_end(key)
+                self.hits += 1
+                return self.data[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        size = self.size_of(value)
+        with self.lock:
+            self._remove(key)
+            # Значение больше всего кэша не сохраняем, чтобы не вытеснять остальное
+            if size > self.max_size:
+                return
+            self.data[key] = value
+            self.sizes[key] = size
+            self.total += size
+            while self.total > self.max_size:
+                oldest = next(iter(self.data))
+                self._remove(oldest)
+
+    def pop(self, key):
+        with self.lock:
+            self._remove(key)
+
+    def clear(self):
+        with self.lock:
+            self.data.clear()
+            self.sizes.clear()
+            self.total = 0
+
+    def _remove(self, key):
+        if key in self.data:
+            del self.data[key]
+            self.total -= self.sizes.pop(key)
+
+    def stats(self):
+        with self.lock:
+            return {
+                'entries': len(self.data),
+                'size': self.total,
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses
+            }
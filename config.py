@@ -1,12 +1,12 @@
 import os
 
 class Config:
+    """Базовые настройки. Модули читают значения из этого класса (Config.X), поэтому
+    выбранный профиль (DevelopmentConfig, LocalConfig, ProductionConfig) копируется сюда
+    функцией configure: при импорте — по переменной окружения APP_CONFIG, затем create_app."""
+    NAME = 'base'
     DEBUG = True
-    SECRET_KEY = "super-secret-key"
-
-    UPLOAD_FOLDER = 'uploads'
-    TEMPLATES_FOLDER = 'templates_json'
-    STATIC_FOLDER = 'static'
+    SECRET_KEY = os.environ.get("SECRET_KEY", "super-secret-key")
 
     SESSION_TIMEOUT_HOURS = 2  
 
@@ -16,8 +16,47 @@ class Config:
     UPLOAD_FOLDER = os.path.join(BASE_DIR, "uploads")
     TEMPLATES_FOLDER = os.path.join(BASE_DIR, "templates_json")
     STATIC_FOLDER = os.path.join(BASE_DIR, "static")
+    CREDENTIALS_FOLDER = os.path.join(BASE_DIR, "credentials")
 
     PDF_DPI = 200
+    # Рендеринг страниц PDF в пуле процессов (1 = последовательно в потоке запроса)
+    PDF_RENDER_WORKERS = min(4, os.cpu_count() or 1)
+    # Документы с меньшим числом страниц рендерятся последовательно
+    PDF_PARALLEL_MIN_PAGES = 4
+
+    # Фоновая конвертация загрузок (/upload?async=1 и /upload_status/<job_id>)
+    UPLOAD_ASYNC = False
+    UPLOAD_JOBS_WORKERS = 2
+    UPLOAD_JOBS_MAX_QUEUE = 20
+    UPLOAD_JOBS_TTL_SECONDS = 3600
+    # Состояние задач на диске: статус отвечает любой воркер gunicorn
+    UPLOAD_JOBS_FOLDER = os.path.join(UPLOAD_FOLDER, ".jobs")
+
+    # Кэш рендеринга по хэшу PDF и настройкам (DPI)
+    RENDER_CACHE_FOLDER = os.path.join(UPLOAD_FOLDER, ".render_cache")
+    RENDER_CACHE_MAX_BYTES = 2 * 1024 ** 3
+
+    # Ленивый рендеринг: /upload сохраняет только PDF, страницы строятся в /uploads/<filename>
+    PDF_LAZY_RENDER = False
+    PAGE_CACHE_FOLDER = os.path.join(UPLOAD_FOLDER, ".page_cache")
+    PAGE_CACHE_MEMORY_BYTES = 200 * 1024 ** 2
+    PAGE_CACHE_DISK_BYTES = 2 * 1024 ** 3
+
+    # HTTP кэширование изображений страниц: срок для URL с ?v=<версия> и кэш ETag файлов
+    IMMUTABLE_MAX_AGE_SECONDS = 365 * 24 * 3600
+    FILE_ETAG_CACHE_SIZE = 10000
+
+    # Сжатие JSON ответов (brotli — если установлен пакет brotli, иначе gzip)
+    JSON_COMPRESS_MIN_BYTES = 1024
+    JSON_GZIP_LEVEL = 6
+    JSON_BROTLI_QUALITY = 5
+
+    # Уменьшенные варианты страниц (/uploads/<filename>?size=<имя>), полный PNG остается 'full'
+    PAGE_VARIANTS = {
+        'thumb': {'width': 240, 'format': 'webp', 'quality': 70},
+        'screen': {'width': 1240, 'format': 'webp', 'quality': 80},
+    }
+    # POPPLER_PATH = r"C:\Program Files\poppler-23.05.0\Library\bin"
 
     GOOGLE_SHEETS_SCOPES = [
         'https://www.googleapis.com/auth/spreadsheets',
@@ -29,6 +68,103 @@ class Config:
 
     ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'pdf'}
 
+    # Кэш таблицы пользователей в AuthManager (после TTL обновляется в фоне)
+    USERS_CACHE_TTL_SECONDS = 300
+    # Подключение к таблице пользователей — при первом входе; после ошибки повтор не чаще
+    AUTH_CONNECT_RETRY_SECONDS = 30
+
+    # Кэш разобранных шаблонов в памяти (ограничение по размеру JSON файлов)
+    TEMPLATE_CACHE_MAX_BYTES = 50 * 1024 ** 2
+    # Индекс шаблонов для /list_templates (id, название, классы, число страниц, дата)
+    TEMPLATE_INDEX_PATH = os.path.join(BASE_DIR, "templates_index.json")
+    TEMPLATE_INDEX_REBUILD_ON_START = True
+    # Формат файлов шаблонов: 'json' — с отступами, 'compact' — без пробелов, координаты
+    # округлены до TEMPLATE_COORD_DECIMALS знаков (включается явно). Читаются оба;
+    # перевести старые файлы: flask --app app migrate-templates --format compact
+    TEMPLATE_STORAGE_FORMAT = 'json'
+    TEMPLATE_COORD_DECIMALS = 2
+
+    # Проверка ответов: число скомпилированных ключей в кэше и сведение
+    # похожих кириллических/латинских букв при сравнении
+    ANSWER_KEY_CACHE_SIZE = 256
+    ANSWER_FOLD_HOMOGLYPHS = True
+    # Максимум работ в одном запросе /check_answers_batch
+    BATCH_MAX_SUBMISSIONS = 500
+
+    # Отложенная запись результатов в Google Sheets: строки копятся и уходят пачками append_rows.
+    # Действует только при RESULT_STORE_ENABLED = False — иначе пачками пишет outbox ниже
+    SHEETS_WRITE_BEHIND = True
+    SHEETS_FLUSH_INTERVAL_SECONDS = 5
+    SHEETS_FLUSH_BATCH_SIZE = 50
+    SHEETS_QUEUE_MAX_ROWS = 10000
+    SHEETS_MAX_ATTEMPTS = 5
+    # Локальное хранилище результатов (SQLite) с outbox синхронизацией в Google Sheets.
+    # Если выключено, строки уходят в очередь SHEETS_WRITE_BEHIND или пишутся сразу
+    RESULT_STORE_ENABLED = True
+    RESULT_STORE_PATH = os.path.join(BASE_DIR, "results.sqlite3")
+    RESULT_OUTBOX_INTERVAL_SECONDS = 5
+    RESULT_OUTBOX_BATCH_SIZE = 200
+    RESULT_OUTBOX_MAX_ATTEMPTS = 10
+    RESULT_OUTBOX_RETRY_SECONDS = 10
+    RESULT_OUTBOX_CLAIM_TIMEOUT_SECONDS = 300
+
+    # Источники учетных данных Google API по назначению, по порядку: 'env' — переменные
+    # окружения (Replit Secrets), 'file' — credentials/credentials.json. Таблица пользователей
+    # читается аккаунтом из окружения, результаты пишет аккаунт из credentials.json — ему
+    # учителя открывают доступ к своим таблицам (без файла — аккаунт из окружения)
+    SHEETS_CREDENTIAL_SOURCES = {
+        'users': ('env',),
+        'results': ('file', 'env'),
+    }
+    # Общий gspread клиент: пул HTTP соединений, таймаут, заблаговременное обновление
+    # токена, время жизни и число открытых таблиц/листов в кэше
+    SHEETS_HTTP_POOL_SIZE = 10
+    SHEETS_HTTP_TIMEOUT_SECONDS = 30
+    SHEETS_TOKEN_REFRESH_MARGIN_SECONDS = 300
+    SHEETS_HANDLE_TTL_SECONDS = 600
+    SHEETS_HANDLE_CACHE_SIZE = 1000
+    # Исполнители блокирующей работы (executors.py): вызовы gspread — в пуле потоков 'sheets',
+    # рендеринг fitz — в пуле процессов 'render' (размер PDF_RENDER_WORKERS). Сверх
+    # *_MAX_QUEUE задач в работе и очереди запрос получает 503, а поток запроса ждет
+    # результат не дольше *_TIMEOUT_SECONDS
+    SHEETS_EXECUTOR_WORKERS = 8
+    SHEETS_EXECUTOR_MAX_QUEUE = 100
+    SHEETS_CALL_TIMEOUT_SECONDS = 20
+    RENDER_EXECUTOR_MAX_QUEUE = 64
+    RENDER_TIMEOUT_SECONDS = 60
+    # Адрес локальной замены Google Sheets API (benchmarks/fake_sheets.py) для нагрузочных
+    # тестов: все запросы gspread уходят туда, учетные данные не нужны
+    SHEETS_API_ENDPOINT = os.environ.get("SHEETS_API_ENDPOINT")
+
+    # Журнал: 'json' — одна строка JSON на запись (для сборщиков логов), 'text' — для консоли
+    LOG_FORMAT = os.environ.get("LOG_FORMAT", "json")
+    LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO")
+    # Метрики Prometheus на /metrics: границы корзин гистограмм (секунды) и токен доступа
+    # (если задан, нужен заголовок Authorization: Bearer <токен> или вход учителя)
+    METRICS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+    METRICS_TOKEN = os.environ.get("METRICS_TOKEN")
+    # Закрытые метрики: без токена и входа учителя /metrics отвечает 404
+    METRICS_REQUIRE_AUTH = False
+
+    # Профилирование запросов (cProfile): заголовок X-Profile: 1 или ?profile=1 от вошедшего
+    # учителя, либо доля всех запросов PROFILE_SAMPLE_RATE (меняется через /profiles/settings)
+    PROFILE_FOLDER = os.path.join(BASE_DIR, "profiles")
+    PROFILE_SAMPLE_RATE = 0.0
+    PROFILE_MAX_FILES = 200
+    PROFILE_MAX_BYTES = 200 * 1024 ** 2
+    # Фоновый прогрев после запуска (warmup.py): PyMuPDF, таблица пользователей и последние
+    # WARMUP_TEMPLATES_LIMIT шаблонов с ключами ответов; пока он идет, /ready отвечает 503
+    WARMUP_ON_START = False
+    WARMUP_TEMPLATES_LIMIT = 50
+    # Кэш шапок листов результатов: (таблица, шапка) -> лист
+    SHEETS_HEADER_CACHE_SIZE = 1000
+    SHEETS_HEADER_CACHE_TTL_SECONDS = 3600
+
+    # Ограничения загрузки: тело запроса (Flask) и один файл при потоковом приеме
+    MAX_CONTENT_LENGTH = 110 * 1024 ** 2
+    MAX_UPLOAD_FILE_BYTES = 100 * 1024 ** 2
+    MAX_PDF_PAGES = 200
+
 
     @staticmethod
     def create_directories():
@@ -37,7 +173,73 @@ class Config:
             Config.UPLOAD_FOLDER, 
             Config.TEMPLATES_FOLDER, 
             Config.STATIC_FOLDER, 
-            "templates"
+            Config.CREDENTIALS_FOLDER,
+            "templates"   # 👈 добавил отдельной строкой
         ]:os.makedirs(folder, exist_ok=True)
 
-   
+    @staticmethod
+    def get_credentials_path():
+        """Возвращает абсолютный путь до credentials.json"""
+        return os.path.join(Config.CREDENTIALS_FOLDER, "credentials.json")
+
+    @staticmethod
+    def check_credentials():
+        """Проверяет, что credentials.json существует"""
+        return os.path.exists(Config.get_credentials_path())
+
+
+class DevelopmentConfig(Config):
+    """Разработка: отладчик Flask"""
+    NAME = 'development'
+    DEBUG = True
+
+
+class LocalConfig(DevelopmentConfig):
+    """Локальная разработка без Google Sheets (бывший config_local.py)"""
+    NAME = 'local'
+    SECRET_KEY = "local-dev-key"
+    # Таблица пользователей отключена: вход не настроен, результаты остаются в result_store
+    USERS_SHEET_URL = None
+
+
+class ProductionConfig(Config):
+    """Продакшен (gunicorn wsgi:app): ключ сессии только из окружения, прогрев при запуске"""
+    NAME = 'production'
+    DEBUG = False
+    SECRET_KEY = os.environ.get("SECRET_KEY")
+    SESSION_COOKIE_HTTPONLY = True
+    SESSION_COOKIE_SAMESITE = 'Lax'
+    SESSION_COOKIE_SECURE = os.environ.get("SESSION_COOKIE_SECURE", "1") == "1"
+    UPLOAD_ASYNC = True
+    WARMUP_ON_START = True
+    METRICS_REQUIRE_AUTH = True
+
+
+CONFIGS = {
+    'development': DevelopmentConfig,
+    'local': LocalConfig,
+    'production': ProductionConfig,
+}
+
+
+# Значения Config без профиля: configure начинает с них, чтобы профили не смешивались
+_BASE_SETTINGS = {key: value for key, value in vars(Config).items() if key.isupper()}
+
+
+def configure(config_class):
+    """Делает config_class (класс или имя из CONFIGS) активным: Config = базовые значения + профиль"""
+    if isinstance(config_class, str):
+        if config_class not in CONFIGS:
+            raise ValueError(f"Неизвестный профиль настроек: {config_class} (есть: {', '.join(CONFIGS)})")
+        config_class = CONFIGS[config_class]
+
+    settings = dict(_BASE_SETTINGS)
+    for cls in reversed(config_class.__mro__):
+        if cls is not Config and issubclass(cls, Config):
+            settings.update((key, value) for key, value in vars(cls).items() if key.isupper())
+    for key, value in settings.items():
+        setattr(Config, key, value)
+    return Config
+
+
+configure(os.environ.get("APP_CONFIG", "development"))
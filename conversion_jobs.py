@@ -0,0 +1,152 @@
+import json
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+
+class ConversionJobs:
+    """Ограниченная локальная очередь фоновых задач конвертации PDF.
+
+    Задачи выполняет воркер, принявший загрузку, а их состояние пишется в
+    UPLOAD_JOBS_FOLDER (файл <job_id>.json), поэтому статус отдает любой воркер.
+    """
+
+    def __init__(self, max_queue, workers, ttl_seconds):
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.jobs = {}
+        self.lock = threading.Lock()
+        self.workers = workers
+        self.ttl_seconds = ttl_seconds
+        self._threads = []
+
+    def _start_workers(self):
+        # Потоки запускаются при первой задаче, а не при импорте модуля
+        if self._threads:
+            return
+        for n in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f"pdf-job-{n}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, func, *args):
+        """Ставит задачу в очередь. Возвращает job_id или None, если очередь заполнена"""
+        job_id = uuid.uuid4().hex
+        job = {
+            'status': 'queued',
+            'pages_done': 0,
+            'pages_total': None,
+            'result': None,
+            'error': None,
+            'updated': time.time()
+        }
+        with self.lock:
+            self._cleanup()
+            self._start_workers()
+            self.jobs[job_id] = job
+            self._save(job_id, job)
+        try:
+            self.queue.put_nowait((job_id, func, args))
+        except queue.Full:
+            with self.lock:
+                del self.jobs[job_id]
+                self._remove(job_id)
+            return None
+        return job_id
+
+    def get(self, job_id):
+        """Возвращает копию состояния задачи или None"""
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job:
+                return dict(job)
+        # Задачу принял другой воркер — читаем ее состояние с диска
+        try:
+            with open(self._path(job_id), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _path(self, job_id):
+        return os.path.join(Config.UPLOAD_JOBS_FOLDER, f"{job_id}.json")
+
+    def _save(self, job_id, job):
+        # Запись через временный файл и os.replace: читатели не видят половину JSON
+        path = self._path(job_id)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(Config.UPLOAD_JOBS_FOLDER, exist_ok=True)
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(job, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+            return True
+        except (OSError, TypeError, ValueError) as e:
+            logger.warning("Не удалось сохранить состояние задачи", extra={'job_id': job_id, 'error': str(e)})
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return False
+
+    def _remove(self, job_id):
+        try:
+            os.remove(self._path(job_id))
+        except FileNotFoundError:
+            pass
+
+    def _update(self, job_id, **changes):
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job:
+                job.update(changes, updated=time.time())
+                saved = self._save(job_id, job)
+                if saved and job['status'] in ('done', 'error'):
+                    # Итог уже на диске, память воркера не держит завершенные задачи
+                    del self.jobs[job_id]
+
+    def _cleanup(self):
+        # Задачи без обновлений дольше TTL удаляются: завершенные и брошенные
+        # воркером, который остановился посреди конвертации
+        now = time.time()
+        try:
+            names = os.listdir(Config.UPLOAD_JOBS_FOLDER)
+        except FileNotFoundError:
+            return
+        for name in names:
+            if not name.endswith('.json') or name[:-5] in self.jobs:
+                continue
+            path = os.path.join(Config.UPLOAD_JOBS_FOLDER, name)
+            try:
+                if now - os.path.getmtime(path) > self.ttl_seconds:
+                    os.remove(path)
+            except OSError:
+                pass
+
+    def _worker(self):
+        while True:
+            job_id, func, args = self.queue.get()
+            self._update(job_id, status='running')
+
+            def progress(done, total):
+                self._update(job_id, pages_done=done, pages_total=total)
+
+            try:
+                result = func(*args, progress=progress)
+                if result is None:
+                    self._update(job_id, status='error', error='Ошибка конвертации PDF')
+                else:
+                    self._update(job_id, status='done', result=result)
+            except Exception as e:
+                self._update(job_id, status='error', error=str(e))
+            finally:
+                self.queue.task_done()
+
+
+conversion_jobs = ConversionJobs(
+    max_queue=Config.UPLOAD_JOBS_MAX_QUEUE,
+    workers=Config.UPLOAD_JOBS_WORKERS,
+    ttl_seconds=Config.UPLOAD_JOBS_TTL_SECONDS
+)
@@ -0,0 +1,171 @@
+import time
+import threading
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, TimeoutError as FutureTimeout
+from config import Config
+import metrics
+
+# Управляемые исполнители блокирующей работы: 'sheets' (потоки, вызовы gspread) и
+# 'render' (процессы, рендеринг fitz). Создаются лениво при первой задаче.
+# Задачи в работе и в очереди ограничены max_queue: при переполнении запрос получает
+# ExecutorBusy (503), а не ждет за другими. Загрузка видна в /metrics и /cache_stats.
+# Процессы запускаются через spawn: fork из многопоточного сервера копирует в потомка
+# блокировки, захваченные другими потоками. Новый процесс заново импортирует config,
+# поэтому настройки активного профиля передаются ему при запуске (_init_process).
+
+
+class ExecutorBusy(Exception):
+    """Исполнитель перегружен или результат не готов за отведенное время"""
+
+    def __init__(self, name, reason):
+        super().__init__(f"Исполнитель {name} перегружен ({reason})")
+        self.name = name
+        self.reason = reason
+
+
+def _init_process(settings):
+    """Запуск процесса пула: Config как в родительском процессе"""
+    for key, value in settings.items():
+        setattr(Config, key, value)
+
+
+class ManagedExecutor:
+    """Пул потоков или процессов со счетчиками загрузки и ограничением очереди"""
+
+    def __init__(self, name, kind, workers, max_queue):
+        self.name = name
+        self.kind = kind
+        self.workers = max(1, workers)
+        self.max_queue = max_queue
+        self._executor = None
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.counters = {'submitted': 0, 'completed': 0, 'failed': 0, 'rejected': 0, 'timeouts': 0}
+
+    def _get_executor(self):
+        if self._executor is None:
+            if self.kind == 'process':
+                settings = {key: value for key, value in vars(Config).items() if key.isupper()}
+                self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                     mp_context=multiprocessing.get_context('spawn'),
+                                                     initializer=_init_process, initargs=(settings,))
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix=self.name)
+        return self._executor
+
+    def submit(self, fn, *args, **kwargs):
+        """Ставит задачу в пул. ExecutorBusy, если в работе и очереди уже max_queue задач"""
+        with self._lock:
+            if self.max_queue and self.in_flight >= self.max_queue:
+                self.counters['rejected'] += 1
+                metrics.inc('executor_rejected_total', executor=self.name, reason='queue_full')
+                raise ExecutorBusy(self.name, 'queue_full')
+            self.in_flight += 1
+            self.counters['submitted'] += 1
+            executor = self._get_executor()
+
+        started = time.perf_counter()
+        try:
+            future = executor.submit(fn, *args, **kwargs)
+        except Exception:
+            with self._lock:
+                self.in_flight -= 1
+            raise
+        future.add_done_callback(lambda f: self._done(f, started))
+        return future
+
+    def _done(self, future, started):
+        failed = future.cancelled() or future.exception() is not None
+        with self._lock:
+            self.in_flight -= 1
+            self.counters['failed' if failed else 'completed'] += 1
+        metrics.inc('executor_tasks_total', executor=self.name, status='error' if failed else 'ok')
+        # Время от постановки в очередь до результата: рост при той же работе — признак насыщения
+        metrics.observe('executor_task_duration_seconds', time.perf_counter() - started, executor=self.name)
+
+    def call(self, fn, *args, timeout=None, **kwargs):
+        """Выполняет fn в пуле и ждет результат не дольше timeout секунд (иначе ExecutorBusy)"""
+        if self.kind == 'thread' and threading.current_thread().name.startswith(f"{self.name}_"):
+            # Вложенный вызов из задачи этого же пула — сразу: ожидание свободного
+            # воркера изнутри пула может занять его целиком
+            return fn(*args, **kwargs)
+        future = self.submit(fn, *args, **kwargs)
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeout:
+            # Задача, которая еще в очереди, отменяется; начатая доработает в пуле
+            future.cancel()
+            with self._lock:
+                self.counters['timeouts'] += 1
+            metrics.inc('executor_rejected_total', executor=self.name, reason='timeout')
+            raise ExecutorBusy(self.name, 'timeout')
+
+    def status(self):
+        with self._lock:
+            in_flight = self.in_flight
+            counters = dict(self.counters)
+        return {
+            'kind': self.kind,
+            'workers': self.workers,
+            'max_queue': self.max_queue,
+            'started': self._executor is not None,
+            'in_flight': in_flight,
+            'queued': max(0, in_flight - self.workers),
+            'saturation': round(in_flight / self.workers, 2),
+            **counters
+        }
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=True)
+
+
+def _settings(name):
+    """(вид пула, размер, max_queue) из Config — читаются при создании исполнителя"""
+    if name == 'sheets':
+        return 'thread', Config.SHEETS_EXECUTOR_WORKERS, Config.SHEETS_EXECUTOR_MAX_QUEUE
+    if name == 'render':
+        return 'process', Config.PDF_RENDER_WORKERS, Config.RENDER_EXECUTOR_MAX_QUEUE
+    raise KeyError(name)
+
+
+_executors = {}
+_executors_lock = threading.Lock()
+
+
+def get(name):
+    """Общий исполнитель процесса по имени ('sheets', 'render')"""
+    with _executors_lock:
+        executor = _executors.get(name)
+        if executor is None:
+            executor = _executors[name] = ManagedExecutor(name, *_settings(name))
+        return executor
+
+
+def status():
+    with _executors_lock:
+        executors = dict(_executors)
+    return {name: executor.status() for name, executor in executors.items()}
+
+
+def shutdown(wait=True):
+    with _executors_lock:
+        executors = list(_executors.values())
+        _executors.clear()
+    for executor in executors:
+        executor.shutdown(wait=wait)
+
+
+def collect_gauges():
+    """Текущая загрузка для /metrics: (имя, метки, значение)"""
+    gauges = []
+    for name, state in status().items():
+        gauges.append(('executor_workers', {'executor': name}, state['workers']))
+        gauges.append(('executor_in_flight', {'executor': name}, state['in_flight']))
+        gauges.append(('executor_queued', {'executor': name}, state['queued']))
+    return gauges
+
+
+metrics.register_collector(collect_gauges)
@@ -0,0 +1,139 @@
+import re
+import unicodedata
+from collections import namedtuple
+from config import Config
+from cache_utils import LRUCache
+import metrics
+
+# Похожие кириллические и латинские буквы сводятся к одной (после casefold),
+# чтобы «сжатие», набранное с латинской «c», засчитывалось. Только буквы, одинаковые
+# в нижнем регистре: строчные «в», «н», «т», «м», «к» не похожи на b, h, t, m, k,
+# а «в» — третий вариант ответа в русской нумерации (а, б, в, г)
+HOMOGLYPHS = str.maketrans({
+    'а': 'a', 'е': 'e', 'о': 'o', 'р': 'p', 'с': 'c', 'у': 'y', 'х': 'x', 'і': 'i'
+})
+WHITESPACE_RE = re.compile(r'\s+')
+HEADER_CLEAN_RE = re.compile(r'[^\w\s\-а-яёА-ЯЁ]')
+
+# Скомпилированное поле: все, что не зависит от ответа ученика
+CompiledField = namedtuple('CompiledField', [
+    'field_id', 'correct_variants', 'normalized', 'numbers', 'tolerance'
+])
+AnswerKey = namedtuple('AnswerKey', ['fields', 'headers'])
+
+_answer_keys = LRUCache(Config.ANSWER_KEY_CACHE_SIZE)
+
+
+def normalize_answer(value):
+    """Unicode NFKC, регистр, пробелы и (опционально) кириллица/латиница"""
+    value = unicodedata.normalize('NFKC', value).casefold()
+    value = WHITESPACE_RE.sub(' ', value).strip()
+    if Config.ANSWER_FOLD_HOMOGLYPHS:
+        value = value.translate(HOMOGLYPHS)
+    return value
+
+
+def parse_number(value):
+    """Число из ответа ('3,5' и '3.5' равнозначны) или None"""
+    try:
+        return float(value.strip().replace(',', '.').replace(' ', ''))
+    except ValueError:
+        return None
+
+
+def _question_header(correct_variants, index, headers):
+    if not correct_variants:
+        return f"Вопрос {index+1}"
+
+    clean_header = HEADER_CLEAN_RE.sub('', correct_variants[0])
+    clean_header = clean_header[:30].strip()
+    if not clean_header:
+        clean_header = f"Вопрос {index+1}"
+
+    if clean_header in headers:
+        return f"{clean_header} ({index+1})"
+    return clean_header
+
+
+@metrics.timed_function('grading', 'compile')
+def compile_answer_key(template):
+    """Подготовка шаблона к проверке: нормализованные варианты, заголовки, числовые допуски.
+
+    Поле с ключом "tolerance" проверяется и как число: ответ засчитывается, если
+    отличается от числового варианта не больше чем на tolerance.
+    """
+    fields = []
+    headers = []
+    for i, field in enumerate(template.get('fields', [])):
+        correct_variants = [v.strip().lower() for v in field.get('variants', [])]
+
+        tolerance = field.get('tolerance')
+        numbers = ()
+        if tolerance is not None:
+            numbers = tuple(n for n in map(parse_number, correct_variants) if n is not None)
+
+        fields.append(CompiledField(
+            field_id=field['id'],
+            correct_variants=correct_variants,
+            normalized=frozenset(normalize_answer(v) for v in correct_variants),
+            numbers=numbers,
+            tolerance=float(tolerance) if tolerance is not None else None
+        ))
+        headers.append(_question_header(correct_variants, i, headers))
+
+    return AnswerKey(fields=fields, headers=headers)
+
+
+def get_answer_key(template_id, version, template):
+    """Скомпилированный ключ из кэша; version меняется при каждом изменении шаблона"""
+    cache_key = (template_id, version)
+    answer_key = _answer_keys.get(cache_key)
+    if answer_key is None:
+        answer_key = compile_answer_key(template)
+        _answer_keys.put(cache_key, answer_key)
+    return answer_key
+
+
+@metrics.timed_function('grading', 'grade')
+def grade(answer_key, answers):
+    """Проверка ответов одного ученика по скомпилированному ключу"""
+    correct_count = 0
+    detailed_results = []
+    student_answers_list = []
+
+    for field in answer_key.fields:
+        student_answer = (answers.get(field.field_id) or "").strip()
+
+        is_correct = False
+        if field.correct_variants:
+            is_correct = normalize_answer(student_answer) in field.normalized
+            if not is_correct and field.numbers:
+                number = parse_number(student_answer)
+                is_correct = number is not None and any(
+                    abs(number - n) <= field.tolerance for n in field.numbers
+                )
+        if is_correct:
+            correct_count += 1
+
+        detailed_results.append({
+            "field_id": field.field_id,
+            "student_answer": student_answer,
+            "correct_variants": field.correct_variants,
+            "is_correct": is_correct
+        })
+        student_answers_list.append(student_answer)
+
+    total_count = len(answer_key.fields)
+    percentage = round((correct_count / total_count) * 100, 2) if total_count else 0
+
+    return {
+        "correct_count": correct_count,
+        "total_count": total_count,
+        "percentage": percentage,
+        "details": detailed_results,
+        "student_answers": student_answers_list
+    }
+
+
+def stats():
+    return _answer_keys.stats()
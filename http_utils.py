@@ -0,0 +1,112 @@
+import os
+import gzip
+import hashlib
+from datetime import datetime, timezone
+from flask import request, jsonify, current_app
+from werkzeug.http import is_resource_modified
+from config import Config
+from cache_utils import LRUCache
+
+try:
+    import brotli
+except ImportError:  # без brotli ответы сжимаются только gzip
+    brotli = None
+
+# Строгие ETag по содержимому файлов: (путь, mtime_ns, размер) -> хэш
+_file_etags = LRUCache(Config.FILE_ETAG_CACHE_SIZE)
+
+
+def content_etag(data):
+    return hashlib.sha256(data).hexdigest()[:32]
+
+
+def file_etag(path):
+    """ETag по содержимому файла; файл перечитывается только после изменения"""
+    stat = os.stat(path)
+    key = (path, stat.st_mtime_ns, stat.st_size)
+    etag = _file_etags.get(key)
+    if etag is None:
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+        etag = digest.hexdigest()[:32]
+        _file_etags.put(key, etag)
+    return etag
+
+
+def page_cache_control(response, immutable):
+    """Cache-Control для изображений страниц.
+
+    URL с ?v=<версия> меняется вместе с содержимым, поэтому такой ответ можно кэшировать
+    навсегда (immutable). Без версии браузер и прокси обязаны перепроверять ETag (304).
+    """
+    response.cache_control.public = True
+    if immutable:
+        # send_file без max_age ставит no-cache — для версионированного URL он не нужен
+        response.cache_control.no_cache = None
+        response.cache_control.max_age = Config.IMMUTABLE_MAX_AGE_SECONDS
+        response.cache_control.immutable = True
+    else:
+        response.cache_control.max_age = 0
+        response.cache_control.no_cache = True
+    return response
+
+
+def mtime_datetime(mtime_ns):
+    return datetime.fromtimestamp(mtime_ns / 1e9, tz=timezone.utc)
+
+
+def conditional_json(build, etag, last_modified=None):
+    """JSON ответ с ETag/Last-Modified и ответом 304 на повторный запрос.
+
+    build() вызывается только если у клиента нет актуальной копии — сериализация
+    большого шаблона при 304 не выполняется. Ответ всегда перепроверяется (no-cache).
+    """
+    if is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+        response = jsonify(build())
+    else:
+        response = current_app.response_class(status=304)
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    response.cache_control.no_cache = True
+    return response
+
+
+def _choose_encoding():
+    accepted = request.accept_encodings
+    if brotli is not None and accepted['br']:
+        return 'br'
+    if accepted['gzip']:
+        return 'gzip'
+    return None
+
+
+def compress_response(response):
+    """after_request: сжатие JSON ответов больше Config.JSON_COMPRESS_MIN_BYTES (br или gzip)"""
+    if (response.status_code != 200 or response.direct_passthrough
+            or response.mimetype != 'application/json'
+            or 'Content-Encoding' in response.headers):
+        return response
+
+    data = response.get_data()
+    if len(data) < Config.JSON_COMPRESS_MIN_BYTES:
+        return response
+    response.vary.add('Accept-Encoding')
+
+    encoding = _choose_encoding()
+    if encoding is None:
+        return response
+    if encoding == 'br':
+        compressed = brotli.compress(data, quality=Config.JSON_BROTLI_QUALITY)
+    else:
+        compressed = gzip.compress(data, compresslevel=Config.JSON_GZIP_LEVEL)
+
+    response.set_data(compressed)
+    response.headers['Content-Encoding'] = encoding
+    # Сжатое представление отличается побайтно — строгий ETag становится слабым
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
@@ -0,0 +1,159 @@
+import time
+import threading
+from contextlib import contextmanager
+from functools import wraps
+from flask import request, g
+from config import Config
+
+# Метрики процесса в формате Prometheus (text exposition 0.0.4).
+# Счетчики: (имя, метки) -> значение; гистограммы: (имя, метки) -> [счетчики корзин, сумма, количество].
+# Gauge (загрузка исполнителей) не хранятся, а считаются при выводе функциями register_collector.
+# У каждого процесса (воркера gunicorn) свои значения — Prometheus собирает их по отдельности.
+_lock = threading.Lock()
+_counters = {}
+_histograms = {}
+# Функции, которые при выводе возвращают текущие значения gauge: [(имя, метки, значение)]
+_collectors = []
+
+DESCRIPTIONS = {
+    'http_requests_total': ('counter', "Запросы по маршрутам и кодам ответа"),
+    'http_request_errors_total': ('counter', "Ответы 5xx по маршрутам"),
+    'http_request_duration_seconds': ('histogram', "Время обработки запроса"),
+    'dependency_calls_total': ('counter', "Вызовы зависимостей (fitz, шаблоны, проверка, Sheets, авторизация)"),
+    'dependency_errors_total': ('counter', "Ошибки вызовов зависимостей"),
+    'dependency_duration_seconds': ('histogram', "Время вызова зависимости"),
+    'executor_workers': ('gauge', "Размер пула исполнителя"),
+    'executor_in_flight': ('gauge', "Задачи исполнителя в работе и в очереди"),
+    'executor_queued': ('gauge', "Задачи исполнителя, ждущие свободного воркера"),
+    'executor_tasks_total': ('counter', "Выполненные задачи исполнителя"),
+    'executor_rejected_total': ('counter', "Задачи, отклоненные из-за переполнения очереди или таймаута"),
+    'executor_task_duration_seconds': ('histogram', "Время задачи исполнителя вместе с ожиданием в очереди"),
+}
+
+
+def _key(name, labels):
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def inc(name, value=1, **labels):
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def observe(name, value, **labels):
+    key = _key(name, labels)
+    buckets = Config.METRICS_BUCKETS
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = [[0] * len(buckets), 0.0, 0]
+        for i, bound in enumerate(buckets):
+            if value <= bound:
+                histogram[0][i] += 1
+        histogram[1] += value
+        histogram[2] += 1
+
+
+def register_collector(collect):
+    """Добавляет источник gauge: collect() -> [(имя, {метки}, значение)] при каждом выводе"""
+    _collectors.append(collect)
+
+
+@contextmanager
+def timed(dependency, operation):
+    """Время, число вызовов и ошибки блока кода: with metrics.timed('sheets', 'append'): ..."""
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        inc('dependency_errors_total', dependency=dependency, operation=operation)
+        raise
+    finally:
+        inc('dependency_calls_total', dependency=dependency, operation=operation)
+        observe('dependency_duration_seconds', time.perf_counter() - started,
+                dependency=dependency, operation=operation)
+
+
+def timed_function(dependency, operation):
+    """Декоратор-вариант timed"""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with timed(dependency, operation):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+# ==============================================================================
+# Метрики HTTP запросов (before_request / after_request)
+# ==============================================================================
+
+def start_request():
+    g.request_started = time.perf_counter()
+
+
+def record_request(response):
+    started = g.pop('request_started', None)
+    if started is None:
+        return response
+
+    # Шаблон маршрута, а не путь: /load_template/<template_id>, а не id каждого шаблона
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    inc('http_requests_total', method=request.method, route=route, status=response.status_code)
+    if response.status_code >= 500:
+        inc('http_request_errors_total', method=request.method, route=route)
+    observe('http_request_duration_seconds', time.perf_counter() - started, method=request.method, route=route)
+    return response
+
+
+# ==============================================================================
+# Вывод
+# ==============================================================================
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in pairs) + '}'
+
+
+def _format_bound(bound):
+    return f"{bound:g}"
+
+
+def render():
+    """Все метрики в текстовом формате Prometheus"""
+    with _lock:
+        counters = dict(_counters)
+        histograms = {key: [list(h[0]), h[1], h[2]] for key, h in _histograms.items()}
+    for collect in _collectors:
+        for name, labels, value in collect():
+            counters[_key(name, labels)] = value
+
+    names = sorted({name for name, _ in counters} | {name for name, _ in histograms})
+    lines = []
+    for name in names:
+        kind, description = DESCRIPTIONS.get(name, ('untyped', name))
+        lines.append(f"# HELP {name} {description}")
+        lines.append(f"# TYPE {name} {kind}")
+
+        for (metric, labels), value in sorted(counters.items()):
+            if metric == name:
+                lines.append(f"{name}{_labels(labels)} {value}")
+
+        for (metric, labels), (buckets, total, count) in sorted(histograms.items()):
+            if metric != name:
+                continue
+            for bound, bucket_count in zip(Config.METRICS_BUCKETS, buckets):
+                lines.append(f"{name}_bucket{_labels(labels, [('le', _format_bound(bound))])} {bucket_count}")
+            lines.append(f"{name}_bucket{_labels(labels, [('le', '+Inf')])} {count}")
+            lines.append(f"{name}_sum{_labels(labels)} {total:.6f}")
+            lines.append(f"{name}_count{_labels(labels)} {count}")
+
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,190 @@
+import os
+import re
+import hashlib
+import logging
+import threading
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from config import Config
+from cache_utils import LRUCache
+from pdf_utils import render_page, page_variants, variant_filename
+import executors
+import metrics
+import render_cache
+
+logger = logging.getLogger(__name__)
+
+# Ленивый рендеринг: страница <base>_page_N.png и ее варианты <base>_page_N_<name>.<ext>
+# строятся из <base>.pdf при первом запросе
+PAGE_FILENAME_RE = re.compile(r'^(?P<base>.+)_page_(?P<number>\d+)(?:_(?P<variant>[a-z]+))?\.(?:png|webp|jpg)$')
+
+_memory_cache = LRUCache(Config.PAGE_CACHE_MEMORY_BYTES, size_of=len)
+_disk_lock = threading.Lock()
+# Страницы, которые сейчас читаются с диска или рендерятся: ключ -> Future с результатом.
+# Параллельные запросы одной страницы ждут первый, а не рендерят ее каждый заново
+_in_flight = {}
+_in_flight_lock = threading.Lock()
+# Версии страниц по исходному PDF: (путь, mtime_ns, размер) -> render_cache.content_version
+_versions = LRUCache(Config.FILE_ETAG_CACHE_SIZE)
+
+
+def _source_pdf(filename):
+    """Возвращает (путь к PDF, индекс страницы, вариант) или None, если файл не страница PDF"""
+    match = PAGE_FILENAME_RE.match(filename)
+    if not match:
+        return None
+
+    number = match.group('number')
+    variant = match.group('variant')
+    page_filename = f"{match.group('base')}_page_{number}.png"
+    if variant is None:
+        if filename != page_filename:
+            return None
+    elif variant not in page_variants() or variant_filename(page_filename, variant) != filename:
+        return None
+
+    pdf_path = os.path.join(Config.UPLOAD_FOLDER, f"{match.group('base')}.pdf")
+    if not os.path.exists(pdf_path):
+        return None
+    return pdf_path, int(number) - 1, variant
+
+
+def remove_pages(base_name):
+    """Удаляет отрендеренные страницы <base_name>_page_N и их варианты из UPLOAD_FOLDER"""
+    removed = 0
+    for name in os.listdir(Config.UPLOAD_FOLDER):
+        match = PAGE_FILENAME_RE.match(name)
+        if match and match.group('base') == base_name:
+            try:
+                os.remove(os.path.join(Config.UPLOAD_FOLDER, name))
+                removed += 1
+            except FileNotFoundError:
+                pass
+    return removed
+
+
+def page_version(filename):
+    """Текущая версия файла страницы (как ?v= в images_data) или None, если исходного PDF нет.
+
+    Страницы названы по имени загрузки, а не по содержимому: после повторной загрузки
+    другого PDF под тем же именем старая версия из URL перестает совпадать.
+    """
+    source = _source_pdf(filename)
+    if not source:
+        return None
+    pdf_path = source[0]
+    try:
+        stat = os.stat(pdf_path)
+    except FileNotFoundError:
+        return None
+
+    key = (pdf_path, stat.st_mtime_ns, stat.st_size)
+    version = _versions.get(key)
+    if version is None:
+        digest = hashlib.sha256()
+        with open(pdf_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+        version = render_cache.content_version(digest.hexdigest())
+        _versions.put(key, version)
+    return version
+
+
+def get_page(filename):
+    """Изображение страницы из памяти, с диска или свежим рендерингом. None, если страницу не построить"""
+    source = _source_pdf(filename)
+    if not source:
+        return None
+    pdf_path, page_index, variant = source
+
+    # Перезагруженный под тем же именем PDF дает новый ключ
+    pdf_mtime = os.stat(pdf_path).st_mtime_ns
+    key = (filename, pdf_mtime)
+    data = _memory_cache.get(key)
+    if data is not None:
+        return data
+
+    with _in_flight_lock:
+        future = _in_flight.get(key)
+        leader = future is None
+        if leader:
+            future = _in_flight[key] = Future()
+
+    if not leader:
+        try:
+            return future.result(timeout=Config.RENDER_TIMEOUT_SECONDS)
+        except FutureTimeout:
+            raise executors.ExecutorBusy('render', 'timeout')
+
+    try:
+        data = _load(filename, pdf_path, page_index, variant, pdf_mtime)
+        if data is not None:
+            _memory_cache.put(key, data)
+        future.set_result(data)
+        return data
+    except BaseException as e:
+        # Ожидающие получают ту же ошибку (например, ExecutorBusy), что и первый запрос
+        future.set_exception(e)
+        raise
+    finally:
+        with _in_flight_lock:
+            _in_flight.pop(key, None)
+
+
+def _load(filename, pdf_path, page_index, variant, pdf_mtime):
+    """Страница из дискового кэша или свежим рендерингом (с записью на диск)"""
+    disk_path = os.path.join(Config.PAGE_CACHE_FOLDER, filename)
+    try:
+        if os.stat(disk_path).st_mtime_ns >= pdf_mtime:
+            with open(disk_path, 'rb') as f:
+                data = f.read()
+            os.utime(disk_path)
+            return data
+    except OSError:
+        pass
+
+    try:
+        data = _render(pdf_path, page_index, variant)
+    except (IndexError, ValueError, RuntimeError) as e:
+        logger.error("Ошибка рендеринга страницы", extra={'page_file': filename, 'error': str(e)})
+        return None
+    _write_disk(disk_path, data)
+    return data
+
+
+@metrics.timed_function('fitz', 'render_page')
+def _render(pdf_path, page_index, variant):
+    """Рендер в пуле процессов 'render' (ExecutorBusy при перегрузке) или в потоке запроса"""
+    if Config.PDF_RENDER_WORKERS <= 1:
+        return render_page(pdf_path, page_index, variant)
+    return executors.get('render').call(render_page, pdf_path, page_index, variant,
+                                        timeout=Config.RENDER_TIMEOUT_SECONDS)
+
+
+def _write_disk(disk_path, data):
+    with _disk_lock:
+        os.makedirs(Config.PAGE_CACHE_FOLDER, exist_ok=True)
+        tmp_path = f"{disk_path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, disk_path)
+        _evict_disk()
+
+
+def _evict_disk():
+    """Удаляет давно не запрошенные страницы, пока кэш не уложится в PAGE_CACHE_DISK_BYTES"""
+    entries = []
+    for name in os.listdir(Config.PAGE_CACHE_FOLDER):
+        path = os.path.join(Config.PAGE_CACHE_FOLDER, name)
+        stat = os.stat(path)
+        entries.append((stat.st_mtime, stat.st_size, path))
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= Config.PAGE_CACHE_DISK_BYTES:
+            break
+        os.remove(path)
+        total -= size
+
+
+def stats():
+    return _memory_cache.stats()
@@ -0,0 +1,219 @@
+import os
+import io
+import logging
+from config import Config
+import metrics
+import executors
+
+try:
+    from PIL import Image
+except ImportError:  # без Pillow генерируется только полноразмерный PNG
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+# fitz (PyMuPDF) импортируется внутри функций рендеринга: модуль загружается при первой
+# конвертации (или в фоновом прогреве warmup), а не при запуске приложения
+
+VARIANT_EXTENSIONS = {'webp': 'webp', 'jpeg': 'jpg', 'png': 'png'}
+VARIANT_MIMETYPES = {'webp': 'image/webp', 'jpg': 'image/jpeg', 'png': 'image/png'}
+
+def _render_pages(pdf_path, output_dir, base_name, zoom, page_numbers, on_page=None):
+    """Рендер списка страниц в PNG. Выполняется в воркере, который открывает свой fitz документ"""
+    import fitz
+
+    image_data = []
+    matrix = fitz.Matrix(zoom, zoom)
+    doc = fitz.open(pdf_path)
+    try:
+        for i in page_numbers:
+            page = doc[i]
+            pix = page.get_pixmap(matrix=matrix)
+            image_filename = f"{base_name}_page_{i+1}.png"
+            image_path = os.path.join(output_dir, image_filename)
+            pix.save(image_path)
+
+            item = {
+                'filename': image_filename,
+                'width': pix.width,
+                'height': pix.height,
+                'page_width': page.rect.width,   # ширина страницы в PDF points
+                'page_height': page.rect.height, # высота страницы в PDF points
+                'zoom': zoom
+            }
+            item['variants'] = variants_info(item)
+            for name, spec in page_variants().items():
+                variant = item['variants'][name]
+                with open(os.path.join(output_dir, variant['filename']), 'wb') as f:
+                    f.write(encode_variant(pix, (variant['width'], variant['height']), spec))
+
+            image_data.append(item)
+            if on_page:
+                on_page(len(image_data))
+    finally:
+        doc.close()
+    return image_data
+
+
+def page_variants():
+    """Уменьшенные варианты страниц из Config.PAGE_VARIANTS (пусто без Pillow)"""
+    if Image is None:
+        return {}
+    return Config.PAGE_VARIANTS
+
+
+def variant_filename(page_filename, name):
+    """Имя файла варианта: <base>_page_N_<name>.<ext>"""
+    spec = page_variants()[name]
+    stem = os.path.splitext(page_filename)[0]
+    return f"{stem}_{name}.{VARIANT_EXTENSIONS[spec['format']]}"
+
+
+def variants_info(item):
+    """Описание всех вариантов страницы. Вариант 'full' — исходный PNG.
+
+    Варианты только уменьшают изображение; координаты полей остаются в PDF points,
+    поэтому масштаб считается по page_width/page_height для любого варианта.
+    """
+    variants = {
+        'full': {
+            'filename': item['filename'],
+            'width': item['width'],
+            'height': item['height'],
+            'zoom': item['zoom']
+        }
+    }
+    for name, spec in page_variants().items():
+        width = min(spec['width'], item['width'])
+        height = max(1, round(item['height'] * width / item['width']))
+        variants[name] = {
+            'filename': variant_filename(item['filename'], name),
+            'width': width,
+            'height': height,
+            'zoom': item['zoom'] * width / item['width']
+        }
+    return variants
+
+
+def encode_variant(pix, size, spec):
+    """Уменьшение и кодирование страницы в формат варианта (WebP/JPEG/PNG)"""
+    image = Image.frombytes('RGB', (pix.width, pix.height), pix.samples)
+    if image.size != size:
+        image = image.resize(size, Image.LANCZOS)
+    buffer = io.BytesIO()
+    image.save(buffer, format=spec['format'].upper(), quality=spec.get('quality', 80))
+    return buffer.getvalue()
+
+
+def _split_pages(page_count, chunks):
+    """Делит страницы на непрерывные диапазоны примерно одинакового размера"""
+    chunks = max(1, min(chunks, page_count))
+    size, extra = divmod(page_count, chunks)
+    ranges = []
+    start = 0
+    for n in range(chunks):
+        stop = start + size + (1 if n < extra else 0)
+        ranges.append(range(start, stop))
+        start = stop
+    return ranges
+
+
+def convert_pdf_to_images(pdf_path, output_dir, progress=None):
+    """Конвертация PDF в PNG изображения с использованием PyMuPDF и передача масштаба для полей.
+
+    При PDF_RENDER_WORKERS > 1 страницы делятся на диапазоны и рендерятся в пуле процессов 'render'.
+    Результат всегда возвращается в порядке страниц.
+    progress(pages_done, pages_total) вызывается по мере готовности страниц.
+    """
+    import fitz
+
+    base_name = os.path.splitext(os.path.basename(pdf_path))[0]
+    zoom = Config.PDF_DPI / 72.0
+
+    try:
+        with metrics.timed('fitz', 'convert'):
+            with fitz.open(pdf_path) as doc:
+                page_count = doc.page_count
+            if progress:
+                progress(0, page_count)
+
+            if Config.PDF_RENDER_WORKERS <= 1 or page_count < Config.PDF_PARALLEL_MIN_PAGES:
+                on_page = (lambda done: progress(done, page_count)) if progress else None
+                return _render_pages(pdf_path, output_dir, base_name, zoom, range(page_count), on_page)
+
+            # Пул процессов 'render' общий с ленивым рендерингом отдельных страниц (executors)
+            pool = executors.get('render')
+            # Диапазонов больше, чем воркеров, чтобы выровнять нагрузку на неравных страницах
+            page_ranges = _split_pages(page_count, pool.workers * 2)
+            futures = []
+            try:
+                for page_range in page_ranges:
+                    futures.append(pool.submit(_render_pages, pdf_path, output_dir, base_name, zoom, page_range))
+            except executors.ExecutorBusy:
+                for future in futures:
+                    future.cancel()
+                raise
+
+            image_data = []
+            for future in futures:
+                image_data.extend(future.result())
+                if progress:
+                    progress(len(image_data), page_count)
+            return image_data
+    except executors.ExecutorBusy:
+        # Перегрузку не выдаем за ошибку PDF: маршрут ответит 503
+        raise
+    except Exception as e:
+        logger.error("Ошибка конвертации PDF (PyMuPDF)", extra={'pdf': pdf_path, 'error': str(e)})
+        return None
+
+
+def read_pdf_pages(pdf_path):
+    """Метаданные страниц без рендеринга: те же поля images_data, что и у convert_pdf_to_images.
+
+    Размер в пикселях вычисляется так же, как его получает get_pixmap с матрицей zoom.
+    """
+    import fitz
+
+    base_name = os.path.splitext(os.path.basename(pdf_path))[0]
+    zoom = Config.PDF_DPI / 72.0
+    matrix = fitz.Matrix(zoom, zoom)
+
+    try:
+        image_data = []
+        with metrics.timed('fitz', 'read_pages'), fitz.open(pdf_path) as doc:
+            for i, page in enumerate(doc):
+                pixel_rect = (page.rect * matrix).irect
+                item = {
+                    'filename': f"{base_name}_page_{i+1}.png",
+                    'width': pixel_rect.width,
+                    'height': pixel_rect.height,
+                    'page_width': page.rect.width,
+                    'page_height': page.rect.height,
+                    'zoom': zoom
+                }
+                item['variants'] = variants_info(item)
+                image_data.append(item)
+        return image_data
+    except Exception as e:
+        logger.error("Ошибка чтения PDF (PyMuPDF)", extra={'pdf': pdf_path, 'error': str(e)})
+        return None
+
+
+def render_page(pdf_path, page_index, variant=None):
+    """Рендер одной страницы PDF (bytes): полноразмерный PNG или уменьшенный вариант.
+
+    Выполняется и в пуле процессов 'render', поэтому метрики считает вызывающий (page_cache).
+    """
+    import fitz
+
+    zoom = Config.PDF_DPI / 72.0
+    with fitz.open(pdf_path) as doc:
+        pix = doc[page_index].get_pixmap(matrix=fitz.Matrix(zoom, zoom))
+    if variant is None:
+        return pix.tobytes('png')
+
+    spec = page_variants()[variant]
+    width = min(spec['width'], pix.width)
+    height = max(1, round(pix.height * width / pix.width))
+    return encode_variant(pix, (width, height), spec)
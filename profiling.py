@@ -0,0 +1,195 @@
+import io
+import os
+import re
+import json
+import time
+import uuid
+import random
+import pstats
+import cProfile
+import logging
+import threading
+from datetime import datetime
+from flask import request, session, g
+from config import Config
+
+# Профилирование отдельных запросов (cProfile).
+# Включается вошедшим учителем для одного запроса (заголовок X-Profile: 1 или ?profile=1)
+# или для доли всех запросов (set_sample_rate, по умолчанию Config.PROFILE_SAMPLE_RATE).
+# Профиль <id>.prof (формат pstats) и описание <id>.json хранятся в Config.PROFILE_FOLDER,
+# старые файлы удаляются сверх PROFILE_MAX_FILES / PROFILE_MAX_BYTES.
+# cProfile видит только поток запроса: рендеринг в пуле процессов попадает в профиль
+# как ожидание future.result(). В процессе профилируется один запрос за раз: на Python 3.12+
+# cProfile работает через общий для интерпретатора sys.monitoring, второй enable() падает
+# с ValueError, а профиль захватывает и работу других потоков. Запрос, пришедший, пока
+# идет другой профиль, выполняется без профилирования.
+logger = logging.getLogger(__name__)
+
+PROFILE_ID_RE = re.compile(r'^[\w\-]+$')
+_sample_rate = Config.PROFILE_SAMPLE_RATE
+_lock = threading.Lock()
+_active = threading.Lock()
+
+
+def sample_rate():
+    return _sample_rate
+
+
+def set_sample_rate(rate):
+    """Доля запросов (0..1), профилируемых без заголовка; действует до перезапуска процесса"""
+    global _sample_rate
+    _sample_rate = min(max(float(rate), 0.0), 1.0)
+    return _sample_rate
+
+
+def _requested():
+    if request.path.startswith('/profiles'):
+        return None
+    flag = request.headers.get('X-Profile') or request.args.get('profile')
+    if flag and session.get('logged_in'):
+        return 'manual'
+    if _sample_rate and random.random() < _sample_rate:
+        return 'sampled'
+    return None
+
+
+def start_profile():
+    """before_request: запускает профилировщик, если запрос нужно профилировать"""
+    trigger = _requested()
+    if trigger is None:
+        return
+    if not _active.acquire(blocking=False):
+        logger.debug("Профилирование пропущено: идет другой профиль", extra={'path': request.path})
+        return
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError as e:
+        # Профилировщик уже включен не нами (другой инструмент через sys.monitoring)
+        _active.release()
+        logger.warning("Профилирование пропущено", extra={'path': request.path, 'error': str(e)})
+        return
+    g.profile = {'profiler': profiler, 'trigger': trigger, 'started': time.perf_counter()}
+
+
+def finish_profile(response):
+    """after_request: останавливает профилировщик и сохраняет профиль"""
+    state = g.pop('profile', None)
+    if state is None:
+        return response
+    _disable(state)
+    duration = time.perf_counter() - state['started']
+
+    try:
+        profile_id = _save(state['profiler'], {
+            'trigger': state['trigger'],
+            'method': request.method,
+            'path': request.path,
+            'route': request.url_rule.rule if request.url_rule else None,
+            'template_id': _template_id(),
+            'status': response.status_code,
+            'duration_ms': round(duration * 1000, 2),
+            'user': session.get('login'),
+        })
+        response.headers['X-Profile-Id'] = profile_id
+    except OSError as e:
+        logger.error("Не удалось сохранить профиль", extra={'error': str(e)})
+    return response
+
+
+def stop_profile(exc):
+    """teardown_request: выключает профилировщик, если after_request не выполнился"""
+    state = g.pop('profile', None)
+    if state is not None:
+        _disable(state)
+
+
+def _disable(state):
+    try:
+        state['profiler'].disable()
+    finally:
+        _active.release()
+
+
+def _template_id():
+    template_id = (request.view_args or {}).get('template_id')
+    if template_id is None and request.is_json:
+        data = request.get_json(silent=True)
+        if isinstance(data, dict):
+            template_id = data.get('template_id')
+    return template_id
+
+
+def _save(profiler, info):
+    os.makedirs(Config.PROFILE_FOLDER, exist_ok=True)
+    route_slug = re.sub(r'[^\w]+', '_', info['path']).strip('_')[:40] or 'root'
+    profile_id = f"{datetime.now():%Y%m%d_%H%M%S}_{route_slug}_{uuid.uuid4().hex[:6]}"
+    info = {'id': profile_id, 'created_at': datetime.now().isoformat(timespec='seconds'), **info}
+
+    profiler.dump_stats(os.path.join(Config.PROFILE_FOLDER, f"{profile_id}.prof"))
+    with open(os.path.join(Config.PROFILE_FOLDER, f"{profile_id}.json"), 'w', encoding='utf-8') as f:
+        json.dump(info, f, ensure_ascii=False)
+
+    _evict()
+    return profile_id
+
+
+def _evict():
+    """Удаляет самые старые профили сверх лимитов числа файлов и объема"""
+    with _lock:
+        entries = []
+        for name in os.listdir(Config.PROFILE_FOLDER):
+            if name.endswith('.prof'):
+                path = os.path.join(Config.PROFILE_FOLDER, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, name[:-5]))
+        entries.sort()
+
+        total = sum(size for _, size, _ in entries)
+        while entries and (len(entries) > Config.PROFILE_MAX_FILES or total > Config.PROFILE_MAX_BYTES):
+            _, size, profile_id = entries.pop(0)
+            total -= size
+            for extension in ('.prof', '.json'):
+                try:
+                    os.remove(os.path.join(Config.PROFILE_FOLDER, profile_id + extension))
+                except FileNotFoundError:
+                    pass
+
+
+def list_profiles():
+    """Описания сохраненных профилей, новые первыми"""
+    if not os.path.isdir(Config.PROFILE_FOLDER):
+        return []
+    profiles = []
+    for name in os.listdir(Config.PROFILE_FOLDER):
+        if not name.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(Config.PROFILE_FOLDER, name), 'r', encoding='utf-8') as f:
+                profiles.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+    profiles.sort(key=lambda p: p.get('id', ''), reverse=True)
+    return profiles
+
+
+def profile_path(profile_id):
+    """Путь к .prof или None, если профиля нет"""
+    if not PROFILE_ID_RE.match(profile_id):
+        return None
+    path = os.path.join(Config.PROFILE_FOLDER, f"{profile_id}.prof")
+    return path if os.path.exists(path) else None
+
+
+def profile_text(profile_id, sort='cumulative', limit=50):
+    """Текстовый отчет pstats (первые limit функций)"""
+    path = profile_path(profile_id)
+    if path is None:
+        return None
+    output = io.StringIO()
+    stats = pstats.Stats(path, stream=output)
+    stats.sort_stats(sort).print_stats(limit)
+    return output.getvalue()
@@ -0,0 +1,177 @@
+import os
+import copy
+import json
+import shutil
+import hashlib
+import threading
+import time
+from config import Config
+from pdf_utils import page_variants
+
+# Кэш отрендеренных PDF: ключ = хэш содержимого PDF + настройки рендеринга.
+# Манифест каждой записи лежит в Config.RENDER_CACHE_FOLDER/<ключ>.json,
+# сами страницы остаются в Config.UPLOAD_FOLDER под своими именами. Загрузка того же
+# PDF под другим именем получает копии страниц под своим именем: страницы называются
+# по имени загрузки, и повторная загрузка первого файла иначе изменила бы шаблоны второго.
+_lock = threading.Lock()
+
+
+def render_settings_key():
+    """Часть ключа, зависящая от настроек рендеринга (DPI и набор вариантов страниц)"""
+    variants = json.dumps(page_variants(), sort_keys=True)
+    return f"dpi{Config.PDF_DPI}_{hashlib.sha256(variants.encode()).hexdigest()[:8]}"
+
+
+def content_version(pdf_hash):
+    """Короткая версия отрендеренных страниц для неизменяемых URL"""
+    return hashlib.sha256(_cache_key(pdf_hash).encode()).hexdigest()[:12]
+
+
+def _item_files(item):
+    """Все файлы страницы: исходный PNG и его варианты"""
+    files = {item['filename']}
+    files.update(variant['filename'] for variant in item.get('variants', {}).values())
+    return files
+
+
+def _cache_key(pdf_hash):
+    return f"{pdf_hash}_{render_settings_key()}"
+
+
+def _manifest_path(key):
+    return os.path.join(Config.RENDER_CACHE_FOLDER, f"{key}.json")
+
+
+def _read_manifest(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _iter_manifests():
+    if not os.path.isdir(Config.RENDER_CACHE_FOLDER):
+        return
+    for name in os.listdir(Config.RENDER_CACHE_FOLDER):
+        if name.endswith('.json'):
+            path = os.path.join(Config.RENDER_CACHE_FOLDER, name)
+            manifest = _read_manifest(path)
+            if manifest is not None:
+                yield path, manifest
+
+
+def get(pdf_hash, base_name=None):
+    """Возвращает images_data из кэша или None. Запись без файлов страниц считается промахом.
+
+    base_name — имя новой загрузки без расширения: если страницы в кэше названы по другой
+    загрузке, они копируются в <base_name>_page_N и images_data ссылается на копии.
+    """
+    path = _manifest_path(_cache_key(pdf_hash))
+    with _lock:
+        manifest = _read_manifest(path)
+        if manifest is None:
+            return None
+
+        files = set().union(*(_item_files(item) for item in manifest['images_data']))
+        if not all(os.path.exists(os.path.join(Config.UPLOAD_FOLDER, name)) for name in files):
+            os.remove(path)
+            return None
+
+        # mtime манифеста — время последнего использования для вытеснения
+        os.utime(path)
+        image_data = manifest['images_data']
+        if base_name is None or not image_data:
+            return image_data
+        cached_base = image_data[0]['filename'].rsplit('_page_', 1)[0]
+        if cached_base == base_name:
+            return image_data
+        return _copy_pages(image_data, cached_base, base_name)
+
+
+def _copy_pages(image_data, cached_base, base_name):
+    """Копии страниц (и вариантов) под именем base_name; возвращает images_data копий"""
+    def renamed(name):
+        return base_name + name[len(cached_base):]
+
+    copied = copy.deepcopy(image_data)
+    for item in copied:
+        for name in _item_files(item):
+            target = os.path.join(Config.UPLOAD_FOLDER, renamed(name))
+            tmp_path = f"{target}.{os.getpid()}.{threading.get_ident()}.tmp"
+            # Копия, а не жесткая ссылка: рендер перезаписывает файлы на месте
+            shutil.copyfile(os.path.join(Config.UPLOAD_FOLDER, name), tmp_path)
+            os.replace(tmp_path, target)
+        item['filename'] = renamed(item['filename'])
+        for variant in item.get('variants', {}).values():
+            variant['filename'] = renamed(variant['filename'])
+    return copied
+
+
+def put(pdf_hash, image_data):
+    """Сохраняет результат рендеринга в кэш и вытесняет старые записи"""
+    files = set().union(*(_item_files(item) for item in image_data))
+    size = sum(
+        os.path.getsize(os.path.join(Config.UPLOAD_FOLDER, name))
+        for name in files
+        if os.path.exists(os.path.join(Config.UPLOAD_FOLDER, name))
+    )
+    manifest = {
+        'images_data': image_data,
+        'size': size,
+        'created': time.time()
+    }
+
+    with _lock:
+        os.makedirs(Config.RENDER_CACHE_FOLDER, exist_ok=True)
+
+        # Страницы с теми же именами перезаписаны — старые записи на них больше не верны
+        for path, other in _iter_manifests():
+            if files & set().union(*(_item_files(item) for item in other['images_data'])):
+                os.remove(path)
+
+        with open(_manifest_path(_cache_key(pdf_hash)), 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False)
+
+        _evict()
+
+
+def _referenced_files():
+    """Имена файлов, на которые ссылаются сохраненные шаблоны"""
+    referenced = set()
+    if not os.path.exists(Config.TEMPLATES_FOLDER):
+        return referenced
+    for filename in os.listdir(Config.TEMPLATES_FOLDER):
+        if filename.endswith('.json'):
+            try:
+                with open(os.path.join(Config.TEMPLATES_FOLDER, filename), 'r', encoding='utf-8') as f:
+                    referenced.update(json.load(f).get('files', []))
+            except (OSError, ValueError):
+                continue
+    return referenced
+
+
+def _evict():
+    """Удаляет давно не использованные записи, пока кэш не уложится в RENDER_CACHE_MAX_BYTES.
+
+    Страницы, используемые в сохраненных шаблонах, остаются на диске.
+    """
+    entries = [(os.path.getmtime(path), path, manifest) for path, manifest in _iter_manifests()]
+    total = sum(manifest.get('size', 0) for _, _, manifest in entries)
+    if total <= Config.RENDER_CACHE_MAX_BYTES:
+        return
+
+    referenced = _referenced_files()
+    for _, path, manifest in sorted(entries, key=lambda entry: entry[0]):
+        if total <= Config.RENDER_CACHE_MAX_BYTES:
+            break
+        os.remove(path)
+        total -= manifest.get('size', 0)
+        for item in manifest['images_data']:
+            if item['filename'] in referenced:
+                continue
+            for name in _item_files(item):
+                try:
+                    os.remove(os.path.join(Config.UPLOAD_FOLDER, name))
+                except OSError:
+                    pass
@@ -0,0 +1,236 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from config import Config
+import sheets_utils
+
+logger = logging.getLogger(__name__)
+
+# Локальное хранилище результатов (SQLite) и outbox для синхронизации с Google Sheets.
+# Работа сначала фиксируется в базе, затем фоновый поток отправляет строки в таблицу.
+# sync_status: NULL — таблица не указана, pending — ждет отправки, sending — отправляется,
+# synced — записана, failed — исчерпаны попытки.
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS submissions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    template_id TEXT NOT NULL,
+    template_name TEXT,
+    student_name TEXT,
+    student_class TEXT,
+    answers TEXT NOT NULL,
+    details TEXT NOT NULL,
+    correct_count INTEGER NOT NULL,
+    total_count INTEGER NOT NULL,
+    percentage REAL NOT NULL,
+    created_at TEXT NOT NULL,
+    sheet_url TEXT,
+    headers TEXT,
+    sheet_row TEXT,
+    sync_status TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL DEFAULT 0,
+    claimed_at REAL,
+    last_error TEXT,
+    synced_at TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_submissions_template ON submissions (template_id, id);
+CREATE INDEX IF NOT EXISTS idx_submissions_outbox ON submissions (sync_status, next_attempt_at);
+"""
+
+_schema_ready = False
+_schema_lock = threading.Lock()
+_outbox_thread = None
+_outbox_lock = threading.Lock()
+
+
+def _connect():
+    global _schema_ready
+    connection = sqlite3.connect(Config.RESULT_STORE_PATH, timeout=30)
+    connection.row_factory = sqlite3.Row
+    if not _schema_ready:
+        with _schema_lock:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.executescript(SCHEMA)
+            _schema_ready = True
+    return connection
+
+
+def record(template_id, template_name, sheet_url, headers, submissions):
+    """Сохраняет проверенные работы одной транзакцией. Возвращает их id.
+
+    submissions — список (student_info, answers, result, sheet_row).
+    """
+    created_at = datetime.now().isoformat(timespec='seconds')
+    status = 'pending' if sheet_url else None
+    ids = []
+    connection = _connect()
+    try:
+        with connection:
+            for student_info, answers, result, sheet_row in submissions:
+                cursor = connection.execute(
+                    """INSERT INTO submissions (template_id, template_name, student_name, student_class,
+                           answers, details, correct_count, total_count, percentage, created_at,
+                           sheet_url, headers, sheet_row, sync_status)
+                       VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                    (
+                        template_id, template_name,
+                        student_info.get('name', ''), student_info.get('class', ''),
+                        json.dumps(answers, ensure_ascii=False),
+                        json.dumps(result['details'], ensure_ascii=False),
+                        result['correct_count'], result['total_count'], result['percentage'],
+                        created_at, sheet_url,
+                        json.dumps(headers, ensure_ascii=False),
+                        json.dumps(sheet_row, ensure_ascii=False),
+                        status
+                    )
+                )
+                ids.append(cursor.lastrowid)
+    finally:
+        connection.close()
+
+    if sheet_url:
+        start_outbox()
+    return ids
+
+
+def list_results(template_id, limit=100, offset=0):
+    """Результаты по шаблону из локальной базы, новые первыми"""
+    connection = _connect()
+    try:
+        rows = connection.execute(
+            """SELECT id, template_id, template_name, student_name, student_class, answers, details,
+                      correct_count, total_count, percentage, created_at, sync_status, synced_at
+               FROM submissions WHERE template_id = ? ORDER BY id DESC LIMIT ? OFFSET ?""",
+            (template_id, limit, offset)
+        ).fetchall()
+    finally:
+        connection.close()
+
+    results = []
+    for row in rows:
+        item = dict(row)
+        item['answers'] = json.loads(item['answers'])
+        item['details'] = json.loads(item['details'])
+        results.append(item)
+    return results
+
+
+def _claim_batch():
+    """Забирает строки для отправки. BEGIN IMMEDIATE не дает двум процессам взять одни и те же строки"""
+    now = time.time()
+    stale = now - Config.RESULT_OUTBOX_CLAIM_TIMEOUT_SECONDS
+    connection = _connect()
+    try:
+        connection.isolation_level = None
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            rows = connection.execute(
+                """SELECT id, sheet_url, headers, sheet_row, attempts FROM submissions
+                   WHERE (sync_status = 'pending' AND next_attempt_at <= ?)
+                      OR (sync_status = 'sending' AND claimed_at < ?)
+                   ORDER BY id LIMIT ?""",
+                (now, stale, Config.RESULT_OUTBOX_BATCH_SIZE)
+            ).fetchall()
+            connection.executemany(
+                "UPDATE submissions SET sync_status = 'sending', claimed_at = ? WHERE id = ?",
+                [(now, row['id']) for row in rows]
+            )
+            connection.execute("COMMIT")
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+    finally:
+        connection.close()
+    return rows
+
+
+def _sync_once():
+    """Отправляет одну пачку. Возвращает число обработанных строк"""
+    rows = _claim_batch()
+    if not rows:
+        return 0
+
+    # Строки одной таблицы с одной шапкой уходят одним append_rows
+    groups = {}
+    for row in rows:
+        groups.setdefault((row['sheet_url'], row['headers']), []).append(row)
+
+    for (sheet_url, headers), group in groups.items():
+        result = sheets_utils.append_results(
+            sheet_url, json.loads(headers), [json.loads(row['sheet_row']) for row in group]
+        )
+        connection = _connect()
+        try:
+            with connection:
+                if result.get('success'):
+                    connection.executemany(
+                        "UPDATE submissions SET sync_status = 'synced', synced_at = ?, last_error = NULL WHERE id = ?",
+                        [(datetime.now().isoformat(timespec='seconds'), row['id']) for row in group]
+                    )
+                    continue
+
+                logger.warning("Ошибка синхронизации с Google Sheets",
+                               extra={'rows': len(group), 'error': result.get('error')})
+                for row in group:
+                    attempts = row['attempts'] + 1
+                    status = 'failed' if attempts >= Config.RESULT_OUTBOX_MAX_ATTEMPTS else 'pending'
+                    # Экспоненциальная задержка между попытками
+                    delay = min(Config.RESULT_OUTBOX_RETRY_SECONDS * 2 ** (attempts - 1), 3600)
+                    connection.execute(
+                        """UPDATE submissions SET sync_status = ?, attempts = ?, next_attempt_at = ?,
+                                  last_error = ? WHERE id = ?""",
+                        (status, attempts, time.time() + delay, result.get('error'), row['id'])
+                    )
+        finally:
+            connection.close()
+    return len(rows)
+
+
+def _outbox_worker():
+    while True:
+        try:
+            processed = _sync_once()
+        except Exception:
+            logger.exception("Ошибка outbox")
+            processed = 0
+        # Пока очередь не пуста, шлем пачки подряд; иначе ждем, чтобы накопить строки
+        if not processed:
+            time.sleep(Config.RESULT_OUTBOX_INTERVAL_SECONDS)
+
+
+def start_outbox():
+    """Запускает фоновую синхронизацию (один поток на процесс)"""
+    global _outbox_thread
+    with _outbox_lock:
+        if _outbox_thread is None:
+            _outbox_thread = threading.Thread(target=_outbox_worker, name="result-outbox", daemon=True)
+            _outbox_thread.start()
+
+
+def pending_count():
+    """Сколько работ ждет отправки в Google Sheets"""
+    connection = _connect()
+    try:
+        return connection.execute(
+            "SELECT COUNT(*) FROM submissions WHERE sync_status IN ('pending', 'sending')"
+        ).fetchone()[0]
+    finally:
+        connection.close()
+
+
+def outbox_status():
+    """Число работ по состояниям синхронизации"""
+    if not os.path.exists(Config.RESULT_STORE_PATH):
+        return {}
+    connection = _connect()
+    try:
+        rows = connection.execute(
+            "SELECT COALESCE(sync_status, 'local'), COUNT(*) FROM submissions GROUP BY sync_status"
+        ).fetchall()
+    finally:
+        connection.close()
+    return {status: count for status, count in rows}
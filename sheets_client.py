@@ -0,0 +1,148 @@
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from config import Config
+from cache_utils import LRUCache
+
+# gspread, google-auth и requests загружаются при первом подключении (get_client):
+# вместе они занимают заметную часть времени запуска приложения
+
+# Один gspread клиент на источник учетных данных ('users' — таблица пользователей,
+# 'results' — таблицы результатов учителей, см. Config.SHEETS_CREDENTIAL_SOURCES):
+# учетные данные читаются один раз, HTTP соединения переиспользуются через пул requests.
+# source -> (клиент, учетные данные)
+_clients = {}
+_client_lock = threading.Lock()
+
+# Открытые таблицы и листы: ключ -> (объект gspread, время истечения).
+# Размер ограничен: ключи — все таблицы и листы, к которым обращался воркер
+_handles = LRUCache(Config.SHEETS_HANDLE_CACHE_SIZE)
+
+
+class CredentialsNotFound(Exception):
+    pass
+
+
+def credentials_from_env():
+    """Собирает информацию сервисного аккаунта из переменных окружения Replit Secrets."""
+
+    # Проверяем наличие ключевого секрета (client_email), чтобы избежать лишней работы
+    if not os.environ.get("client_email"):
+        return None
+
+    # ВАЖНО: Заменяем \\n на \n в private_key, иначе ключ не сработает!
+    private_key = os.environ.get("private_key", "").replace('\\n', '\n')
+
+    # Простая проверка, что ключ не пуст после замены
+    if not private_key or not os.environ.get("project_id"):
+        return None
+
+    return {
+        "type": "service_account",
+        "project_id": os.environ.get("project_id"),
+        "private_key_id": os.environ.get("private_key_id"),
+        "private_key": private_key,
+        "client_email": os.environ.get("client_email"),
+        "client_id": os.environ.get("client_id"),
+        "auth_uri": os.environ.get("auth_uri"),
+        "token_uri": os.environ.get("token_uri"),
+        "auth_provider_x509_cert_url": os.environ.get("auth_provider_x509_cert_url"),
+        "client_x509_cert_url": os.environ.get("client_x509_cert_url"),
+        "universe_domain": os.environ.get("universe_domain")
+    }
+
+
+def local_endpoint():
+    """Адрес локальной замены Google Sheets API или None"""
+    return Config.SHEETS_API_ENDPOINT
+
+
+def _load_credentials(source):
+    """Учетные данные источника: варианты из Config.SHEETS_CREDENTIAL_SOURCES[source] по порядку
+    ('env' — переменные окружения, 'file' — credentials/credentials.json)"""
+    from google.oauth2.service_account import Credentials
+
+    for kind in Config.SHEETS_CREDENTIAL_SOURCES[source]:
+        if kind == 'env':
+            credentials_info = credentials_from_env()
+            if credentials_info:
+                return Credentials.from_service_account_info(credentials_info, scopes=Config.GOOGLE_SHEETS_SCOPES)
+        elif kind == 'file':
+            creds_path = os.path.join(Config.CREDENTIALS_FOLDER, 'credentials.json')
+            if os.path.exists(creds_path):
+                return Credentials.from_service_account_file(creds_path, scopes=Config.GOOGLE_SHEETS_SCOPES)
+
+    if source == 'users':
+        raise CredentialsNotFound("Учетные данные Google API не найдены в переменных окружения")
+    raise CredentialsNotFound("Файл credentials.json не найден")
+
+
+def _refresh_if_expiring(credentials, session):
+    """Обновляет токен заранее, чтобы запрос не ждал обновления после 401"""
+    from google.auth.transport.requests import Request
+
+    margin = timedelta(seconds=Config.SHEETS_TOKEN_REFRESH_MARGIN_SECONDS)
+    expiry = credentials.expiry
+    if not credentials.valid or (expiry and expiry - margin <= datetime.utcnow()):
+        credentials.refresh(Request(session))
+
+
+def get_client(source='results'):
+    """Общий gspread клиент источника. CredentialsNotFound, если учетные данные не настроены"""
+    with _client_lock:
+        if source not in _clients:
+            import gspread
+            from google.auth.credentials import AnonymousCredentials
+            from google.auth.transport.requests import AuthorizedSession
+            import sheets_http
+
+            if Config.SHEETS_API_ENDPOINT:
+                credentials = AnonymousCredentials()
+                adapter_class = sheets_http.EndpointAdapter
+            else:
+                credentials = _load_credentials(source)
+                adapter_class = sheets_http.MeteredAdapter
+            session = AuthorizedSession(credentials)
+            adapter = adapter_class(
+                pool_connections=Config.SHEETS_HTTP_POOL_SIZE,
+                pool_maxsize=Config.SHEETS_HTTP_POOL_SIZE
+            )
+            session.mount('https://', adapter)
+            client = gspread.Client(auth=credentials, session=session)
+            client.set_timeout(Config.SHEETS_HTTP_TIMEOUT_SECONDS)
+            _clients[source] = (client, credentials)
+
+        client, credentials = _clients[source]
+        _refresh_if_expiring(credentials, client.http_client.session)
+        return client
+
+
+def _cached_handle(key, factory):
+    now = time.monotonic()
+    cached = _handles.get(key)
+    if cached and cached[1] > now:
+        return cached[0]
+
+    handle = factory()
+    _handles.put(key, (handle, now + Config.SHEETS_HANDLE_TTL_SECONDS))
+    return handle
+
+
+def open_by_url(sheet_url, source='results'):
+    """Таблица по URL через клиент источника (кэшируется на SHEETS_HANDLE_TTL_SECONDS)"""
+    return _cached_handle(('spreadsheet', sheet_url, source), lambda: get_client(source).open_by_url(sheet_url))
+
+
+def worksheet(sheet_url, title, source='results'):
+    """Лист таблицы по названию (кэшируется). WorksheetNotFound, если листа нет"""
+    return _cached_handle(('worksheet', sheet_url, title, source),
+                          lambda: open_by_url(sheet_url, source).worksheet(title))
+
+
+def invalidate(sheet_url):
+    """Сбрасывает кэш таблицы и ее листов (например, после ошибки API)"""
+    with _handles.lock:
+        keys = [key for key in _handles.data if key[1] == sheet_url]
+    for key in keys:
+        _handles.pop(key)
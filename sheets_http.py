@@ -0,0 +1,44 @@
+from urllib.parse import urlsplit
+from requests.adapters import HTTPAdapter
+from config import Config
+import metrics
+
+# HTTP адаптеры сессии gspread. Отдельный модуль, чтобы requests импортировался
+# только при создании клиента (sheets_client.get_client)
+
+
+def _operation(method, url):
+    """Вид запроса к Google API для метрик: metadata, values_get, append, batch_update, token..."""
+    path = urlsplit(url).path
+    if path.endswith('/token'):
+        return 'token'
+    if path.endswith(':append'):
+        return 'append'
+    if path.endswith(':batchUpdate'):
+        return 'batch_update'
+    if '/values' in path:
+        return 'values_get' if method == 'GET' else 'values_update'
+    if '/spreadsheets/' in path:
+        return 'metadata'
+    return 'other'
+
+
+class MeteredAdapter(HTTPAdapter):
+    """Время, число и ошибки каждого HTTP запроса gspread (метрики dependency="sheets")"""
+
+    def send(self, request, **kwargs):
+        operation = _operation(request.method, request.url)
+        with metrics.timed('sheets', operation):
+            response = super().send(request, **kwargs)
+        if response.status_code >= 400:
+            metrics.inc('dependency_errors_total', dependency='sheets', operation=operation)
+        return response
+
+
+class EndpointAdapter(MeteredAdapter):
+    """Перенаправляет запросы к Google API на Config.SHEETS_API_ENDPOINT"""
+
+    def send(self, request, **kwargs):
+        parts = urlsplit(request.url)
+        request.url = Config.SHEETS_API_ENDPOINT.rstrip('/') + parts.path + (f"?{parts.query}" if parts.query else '')
+        return super().send(request, **kwargs)
@@ -0,0 +1,260 @@
+import atexit
+import logging
+import threading
+import time
+from datetime import datetime
+from config import Config
+from cache_utils import LRUCache
+import sheets_client
+import executors
+
+logger = logging.getLogger(__name__)
+
+RESULTS_WORKSHEET = "Результаты"
+
+# (таблица, шапка) -> {'title': название листа, 'expires': время}
+_header_cache = LRUCache(Config.SHEETS_HEADER_CACHE_SIZE)
+
+BASE_HEADERS = [
+    "Название шаблона",
+    "ФИО",
+    "Класс",
+    "Дата",
+    "Время",
+    "Правильных ответов",
+    "Всего вопросов",
+    "Процент"
+]
+
+
+def result_row(template_name, student_info, result, now=None):
+    """Строка результата ученика: базовые колонки + ответы по порядку полей"""
+    now = now or datetime.now()
+    return [
+        template_name,
+        student_info.get("name", ""),
+        student_info.get("class", ""),
+        now.strftime("%d.%m.%Y"),
+        now.strftime("%H:%M:%S"),
+        result['correct_count'],
+        result['total_count'],
+        f"{result['percentage']}%"
+    ] + result['student_answers']
+
+
+def _find_results_worksheet(sheet, all_headers):
+    """Лист для заголовков: "Результаты", "Результаты 2", ... — первый пустой или с той же шапкой.
+
+    Листы с другой шапкой (старые версии шаблона или другие шаблоны) не очищаются,
+    для новой шапки создается следующий по номеру лист.
+    """
+    existing = {worksheet.title: worksheet for worksheet in sheet.worksheets()}
+    number = 1
+    while True:
+        title = RESULTS_WORKSHEET if number == 1 else f"{RESULTS_WORKSHEET} {number}"
+        worksheet = existing.get(title)
+        if worksheet is None:
+            worksheet = sheet.add_worksheet(title=title, rows=1000, cols=len(all_headers))
+            worksheet.append_row(all_headers)
+            return worksheet
+
+        # Читаем только первую строку, а не весь лист
+        first_row = worksheet.row_values(1)
+        if not first_row:
+            worksheet.append_row(all_headers)
+            return worksheet
+        if first_row == all_headers:
+            return worksheet
+        number += 1
+
+
+def _results_worksheet(sheet, sheet_url, all_headers):
+    """Лист результатов с кэшем (таблица, шапка) -> название листа.
+
+    Шапка строится из скомпилированного ключа шаблона, поэтому новая версия шаблона
+    с другими вопросами дает новый ключ кэша.
+    """
+    import gspread  # уже загружен клиентом sheets_client
+
+    key = (sheet_url, tuple(all_headers))
+    cached = _header_cache.get(key)
+    if cached is not None and cached['expires'] > time.monotonic():
+        try:
+            return sheets_client.worksheet(sheet_url, cached['title'])
+        except gspread.WorksheetNotFound:
+            _header_cache.pop(key)
+
+    worksheet = _find_results_worksheet(sheet, all_headers)
+    _header_cache.put(key, {
+        'title': worksheet.title,
+        'expires': time.monotonic() + Config.SHEETS_HEADER_CACHE_TTL_SECONDS
+    })
+    return worksheet
+
+
+def append_results(sheet_url, question_headers, rows):
+    """Записывает строки результатов на лист с подходящей шапкой одним вызовом append_rows"""
+    try:
+        sheet = sheets_client.open_by_url(sheet_url)
+
+        all_headers = BASE_HEADERS + question_headers
+        worksheet = _results_worksheet(sheet, sheet_url, all_headers)
+
+        worksheet.append_rows(rows)
+
+        values_count = sum(len(row) for row in rows)
+        return {
+            "success": True,
+            "message": f"Результаты сохранены. Добавлено {values_count} значений",
+            "headers": question_headers
+        }
+
+    except sheets_client.CredentialsNotFound as e:
+        return {"success": False, "error": str(e)}
+    except Exception as e:
+        # Открытые листы могли устареть (удалены, переименованы) — откроем заново
+        sheets_client.invalidate(sheet_url)
+        return {"success": False, "error": str(e)}
+
+
+class ResultWriter:
+    """Отложенная запись результатов в Google Sheets.
+
+    Используется, только когда локальное хранилище выключено (RESULT_STORE_ENABLED=False):
+    иначе строки в таблицу отправляет outbox result_store.
+
+    Строки копятся в очереди по (таблица, заголовки) и уходят одним append_rows,
+    когда в группе набралось batch_size строк или прошло flush_interval секунд.
+    При ошибке строки возвращаются в очередь и повторяются при следующей записи.
+    Попытки считаются для каждой строки: строка отбрасывается после max_attempts
+    неудачных записей, в которых участвовала она сама.
+    """
+
+    def __init__(self, flush_interval, batch_size, max_pending, max_attempts):
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+        self.max_attempts = max_attempts
+        self.groups = {}  # (sheet_url, tuple(headers)) -> {'rows': [[строка, попытки], ...], 'since': time}
+        self.pending = 0
+        self.last_error = None
+        self.last_flush = None
+        self.condition = threading.Condition()
+        self._thread = None
+
+    def _start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="sheets-writer", daemon=True)
+            self._thread.start()
+            atexit.register(self.flush)
+
+    def enqueue(self, sheet_url, question_headers, rows):
+        """Ставит строки в очередь и сразу возвращает статус для ответа клиенту"""
+        with self.condition:
+            if self.pending + len(rows) > self.max_pending:
+                return {"success": False, "error": "Очередь записи в Google Sheets переполнена"}
+
+            self._start()
+            group = self.groups.setdefault(
+                (sheet_url, tuple(question_headers)),
+                {'rows': [], 'since': time.monotonic()}
+            )
+            group['rows'].extend([row, 0] for row in rows)
+            self.pending += len(rows)
+            if len(group['rows']) >= self.batch_size:
+                self.condition.notify()
+
+            return {
+                "success": True,
+                "queued": True,
+                "message": "Результаты приняты и будут записаны в Google Таблицу",
+                "headers": question_headers,
+                "queue": self._status()
+            }
+
+    def _due_groups(self, force):
+        now = time.monotonic()
+        due = []
+        for key, group in list(self.groups.items()):
+            if force or len(group['rows']) >= self.batch_size or now - group['since'] >= self.flush_interval:
+                due.append((key, self.groups.pop(key)))
+        return due
+
+    def _run(self):
+        while True:
+            with self.condition:
+                self.condition.wait(timeout=self.flush_interval)
+                due = self._due_groups(force=False)
+            self._write(due)
+
+    def flush(self):
+        """Немедленно записывает все накопленные строки"""
+        with self.condition:
+            due = self._due_groups(force=True)
+        self._write(due)
+
+    def _write(self, due):
+        for (sheet_url, headers), batch in due:
+            entries = batch['rows']
+            result = append_results(sheet_url, list(headers), [row for row, _ in entries])
+            with self.condition:
+                if result.get('success'):
+                    self.pending -= len(entries)
+                    self.last_flush = datetime.now().isoformat(timespec='seconds')
+                    continue
+
+                self.last_error = result.get('error')
+                retry = [[row, attempts + 1] for row, attempts in entries if attempts + 1 < self.max_attempts]
+                dropped = len(entries) - len(retry)
+                logger.warning("Ошибка записи в Google Sheets",
+                               extra={'rows': len(entries), 'dropped': dropped, 'error': self.last_error})
+                self.pending -= dropped
+                if not retry:
+                    continue
+
+                # Возвращаем строки в начало группы, чтобы сохранить порядок; новые строки,
+                # пришедшие за время записи, сохраняют свой счетчик попыток
+                group = self.groups.setdefault(
+                    (sheet_url, headers), {'rows': [], 'since': time.monotonic()}
+                )
+                group['rows'][:0] = retry
+
+    def _status(self):
+        return {
+            "pending_rows": self.pending,
+            "groups": len(self.groups),
+            "last_flush": self.last_flush,
+            "last_error": self.last_error
+        }
+
+    def status(self):
+        with self.condition:
+            return self._status()
+
+
+result_writer = ResultWriter(
+    flush_interval=Config.SHEETS_FLUSH_INTERVAL_SECONDS,
+    batch_size=Config.SHEETS_FLUSH_BATCH_SIZE,
+    max_pending=Config.SHEETS_QUEUE_MAX_ROWS,
+    max_attempts=Config.SHEETS_MAX_ATTEMPTS
+)
+
+
+def save_results(sheet_url, question_headers, rows):
+    """Запись результатов: через очередь (SHEETS_WRITE_BEHIND) или сразу"""
+    if Config.SHEETS_WRITE_BEHIND:
+        return result_writer.enqueue(sheet_url, question_headers, rows)
+    try:
+        # Прямая запись — в пуле 'sheets': медленный Google API держит поток запроса
+        # не дольше SHEETS_CALL_TIMEOUT_SECONDS
+        return executors.get('sheets').call(append_results, sheet_url, question_headers, rows,
+                                            timeout=Config.SHEETS_CALL_TIMEOUT_SECONDS)
+    except executors.ExecutorBusy as e:
+        if e.reason != 'timeout':
+            raise
+        return {
+            "success": False,
+            "pending": True,
+            "message": "Google Таблица отвечает медленно: запись продолжается в фоне",
+            "headers": question_headers
+        }
@@ -14,6 +14,8 @@ let currentTemplate = {
 let currentPage = 0;
 let selectedField = null;
 let fieldCounter = 0;
+// Состояние шаблона на момент последней загрузки/записи — для отправки только изменений
+let savedSnapshot = null;
 
 // Инициализация
 document.addEventListener('DOMContentLoaded', function () {
@@ -122,10 +124,16 @@ async function handleFileUpload(event) {
 
     const formData = new FormData();
     formData.append('file', file);
+    formData.append('async', '1');
 
     try {
         const response = await fetch('/upload', { method: 'POST', body: formData });
-        const result = await response.json();
+        let result = await response.json();
+
+        // PDF конвертируется в фоне: опрашиваем статус задачи
+        if (result.success && result.job_id) {
+            result = await waitForConversionJob(result.status_url);
+        }
 
         if (result.success) {
             
@@ -162,7 +170,8 @@ async function handleFileUpload(event) {
                 fields: [],
                 sheet_url: '',
                 classes: [],
-                images_data: result.files
+                // images_data описывает размеры страницы и все варианты изображения
+                images_data: result.images_data || result.files
             };
             
             currentPage = 0;
@@ -178,6 +187,44 @@ async function handleFileUpload(event) {
     }
 }
 
+// Опрос статуса ограничен по времени; подряд идущие ошибки (404, сеть) прерывают ожидание
+const CONVERSION_POLL_TIMEOUT_MS = 10 * 60 * 1000;
+const CONVERSION_POLL_MAX_ERRORS = 5;
+
+async function waitForConversionJob(statusUrl) {
+    const deadline = Date.now() + CONVERSION_POLL_TIMEOUT_MS;
+    let errors = 0;
+    while (Date.now() < deadline) {
+        await new Promise(resolve => setTimeout(resolve, 1000));
+        let response;
+        let status;
+        try {
+            response = await fetch(statusUrl);
+            status = await response.json();
+        } catch (error) {
+            status = null;
+        }
+
+        // 404 и 5xx могут быть временными (перезапуск воркера) — повторяем несколько раз
+        if (!response || !status || response.status === 404 || response.status >= 500) {
+            errors += 1;
+            if (errors >= CONVERSION_POLL_MAX_ERRORS) {
+                return { success: false, error: (status && status.error) || 'Не удалось получить статус конвертации' };
+            }
+            continue;
+        }
+        errors = 0;
+
+        if (!status.success || status.status === 'done') {
+            return status;
+        }
+        if (status.pages_total) {
+            console.log(`Конвертация PDF: ${status.pages_done} / ${status.pages_total}`);
+        }
+    }
+    return { success: false, error: 'Превышено время ожидания конвертации PDF' };
+}
+
 function clearForm() {
     ['templateName', 'sheetUrl', 'availableClasses'].forEach(id => {
         const el = document.getElementById(id);
@@ -203,7 +250,8 @@ function loadDocument() {
     pageDiv.style.position = 'relative';
 
     const img = document.createElement('img');
-    img.src = `/uploads/${currentTemplate.files[currentPage]}`;
+    const version = currentTemplate.images_data?.[currentPage]?.version;
+    img.src = `/uploads/${currentTemplate.files[currentPage]}` + (version ? `?v=${version}` : '');
     
     // !!! ГЛАВНОЕ ИСПРАВЛЕНИЕ: Отрисовка полей после загрузки изображения !!!
     img.onload = function () {
@@ -534,6 +582,13 @@ async function saveTemplate() {
 
     if (!currentTemplate.template_id) currentTemplate.template_id = `tpl_${Date.now()}`;
 
+    // Если изменились только поля — отправляем операции над ними, а не весь шаблон
+    if (savedSnapshot && savedSnapshot.meta === templateMeta()) {
+        const ops = fieldChanges();
+        if (ops.length === 0) { showModal('Изменений нет'); return; }
+        if (await patchTemplateFields(ops)) return;
+    }
+
     try {
         const response = await fetch('/save_template', {
             method: 'POST',
@@ -541,7 +596,11 @@ async function saveTemplate() {
             body: JSON.stringify(currentTemplate)
         });
         const result = await response.json();
-        if (result.success) showModal('Шаблон сохранен успешно');
+        if (result.success) {
+            currentTemplate.version = result.version;
+            takeSnapshot();
+            showModal('Шаблон сохранен успешно');
+        }
         else showModal('Ошибка сохранения: ' + result.error);
         loadTemplateList();
     } catch (err) {
@@ -549,6 +608,57 @@ async function saveTemplate() {
     }
 }
 
+function templateMeta() {
+    const { fields, version, ...meta } = currentTemplate;
+    return JSON.stringify(meta);
+}
+
+function takeSnapshot() {
+    savedSnapshot = {
+        meta: templateMeta(),
+        fields: new Map(currentTemplate.fields.map(f => [f.id, JSON.stringify(f)]))
+    };
+}
+
+function fieldChanges() {
+    const ops = [];
+    const current = new Map(currentTemplate.fields.map(f => [f.id, f]));
+    savedSnapshot.fields.forEach((_, id) => {
+        if (!current.has(id)) ops.push({ op: 'delete', id });
+    });
+    current.forEach((field, id) => {
+        const saved = savedSnapshot.fields.get(id);
+        if (!saved) ops.push({ op: 'add', field });
+        else if (saved !== JSON.stringify(field)) ops.push({ op: 'update', ...field });
+    });
+    return ops;
+}
+
+/**
+ * Отправляет изменения полей. Возвращает false, если нужно сохранить шаблон целиком
+ * (например, шаблон изменен в другой вкладке).
+ */
+async function patchTemplateFields(ops) {
+    try {
+        const response = await fetch(`/templates/${currentTemplate.template_id}/fields`, {
+            method: 'PATCH',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ base_version: currentTemplate.version, ops })
+        });
+        const result = await response.json();
+        if (!result.success) {
+            if (response.status === 409 && !confirm('Шаблон был изменен в другом окне. Перезаписать его?')) return true;
+            return false;
+        }
+        currentTemplate.version = result.version;
+        takeSnapshot();
+        showModal('Шаблон сохранен успешно');
+        return true;
+    } catch (err) {
+        return false;
+    }
+}
+
 async function loadTemplateList() {
     try {
         const response = await fetch('/list_templates');
@@ -578,6 +688,7 @@ async function loadSelectedTemplate() {
             currentTemplate = template;
             currentPage = 0;
             updateFieldCounter();
+            takeSnapshot();
             
             // Обновляем поля ввода
             ['templateName', 'sheetUrl', 'availableClasses'].forEach(id => {
@@ -178,7 +178,7 @@ function loadTestDocument() {
     pageDiv.style.display = 'inline-block';
 
     const img = document.createElement('img');
-    img.src = `/uploads/${currentTemplate.files[currentPage]}`;
+    img.src = pageImageUrl(currentPage);
     img.style.maxWidth = '100%';
     img.style.height = 'auto';
     img.style.display = 'block';
@@ -200,6 +200,33 @@ function loadTestDocument() {
     viewer.appendChild(pageDiv);
 }
 
+/**
+ * URL изображения страницы. Если в images_data описаны варианты (thumb, screen, full),
+ * берем самый легкий из тех, что не уже ширины экрана: поля считаются в PDF points,
+ * поэтому масштаб не зависит от выбранного варианта.
+ */
+function pageImageUrl(pageIndex) {
+    const file = currentTemplate.files[pageIndex];
+    const pageData = currentTemplate.images_data?.[pageIndex];
+    const params = new URLSearchParams();
+    // Версия делает URL неизменяемым — браузер кэширует страницу без перепроверки
+    if (pageData?.version) params.set('v', pageData.version);
+
+    const variants = pageData?.variants;
+    if (variants) {
+        const viewer = document.getElementById('documentViewer');
+        const neededWidth = (viewer?.clientWidth || window.innerWidth) * (window.devicePixelRatio || 1);
+
+        const suitable = Object.entries(variants)
+            .filter(([name, v]) => name !== 'full' && v.width >= neededWidth)
+            .sort((a, b) => a[1].width - b[1].width);
+        if (suitable.length) params.set('size', suitable[0][0]);
+    }
+
+    const query = params.toString();
+    return query ? `/uploads/${file}?${query}` : `/uploads/${file}`;
+}
+
 function renderFieldsForPage(pageIndex) {
     const viewer = document.getElementById('documentViewer');
     viewer.innerHTML = ''; // очищаем перед загрузкой
@@ -209,7 +236,7 @@ function renderFieldsForPage(pageIndex) {
     page.style.position = 'relative';
 
     const img = document.createElement('img');
-    img.src = `/uploads/${currentTemplate.files[pageIndex]}`;
+    img.src = pageImageUrl(pageIndex);
     img.style.width = '100%';
     img.style.display = 'block';
 
@@ -0,0 +1,431 @@
+import os
+import json
+import logging
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from config import Config
+from cache_utils import LRUCache
+import metrics
+
+try:
+    import orjson
+except ImportError:  # без orjson шаблоны разбираются стандартным json
+    orjson = None
+
+try:
+    import fcntl
+except ImportError:  # Windows: блокировки только между потоками одного процесса
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+STORAGE_FORMATS = ('json', 'compact')
+# Поля, которые можно менять через patch_fields (операция update)
+FIELD_KEYS = ('page', 'x', 'y', 'w', 'h', 'variants', 'checkable', 'tolerance')
+# Координаты поля в пикселях страницы; в компактном формате округляются
+COORDINATE_KEYS = ('x', 'y', 'w', 'h')
+
+# Разобранные шаблоны: template_id -> {'signature': (mtime_ns, size), 'data': dict}.
+# Запись актуальна, пока у файла не изменились mtime и размер.
+_cache = LRUCache(Config.TEMPLATE_CACHE_MAX_BYTES, size_of=lambda entry: entry['signature'][1])
+_counters = {'hits': 0, 'misses': 0}
+_counters_lock = threading.Lock()
+
+
+# Без fcntl файловые блокировки заменяет одна блокировка процесса (повторно входимая:
+# запись шаблона обновляет индекс, не отпуская блокировку шаблона)
+_fallback_lock = threading.RLock()
+
+
+@contextmanager
+def _file_lock(lock_path):
+    """Монопольная блокировка между потоками и процессами (gunicorn воркерами): flock на lock_path"""
+    if fcntl is None:
+        with _fallback_lock:
+            yield
+        return
+    os.makedirs(os.path.dirname(lock_path), exist_ok=True)
+    with open(lock_path, 'a') as f:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+class TemplateConflict(Exception):
+    """Шаблон изменился после версии, на которой основаны правки"""
+    pass
+
+
+def template_path(template_id):
+    return os.path.join(Config.TEMPLATES_FOLDER, f"{template_id}.json")
+
+
+def decode_template(raw):
+    """Разбор файла шаблона. Оба формата — JSON, поэтому старые файлы читаются как есть"""
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw.decode('utf-8'))
+
+
+def read_template_file(path):
+    with open(path, 'rb') as f:
+        return decode_template(f.read())
+
+
+def quantize_coordinates(data):
+    """Копия шаблона с координатами полей, округленными до TEMPLATE_COORD_DECIMALS знаков"""
+    fields = []
+    for field in data.get('fields', []):
+        field = dict(field)
+        for key in COORDINATE_KEYS:
+            if isinstance(field.get(key), float):
+                field[key] = round(field[key], Config.TEMPLATE_COORD_DECIMALS)
+        fields.append(field)
+    return {**data, 'fields': fields} if 'fields' in data else dict(data)
+
+
+def encode_template(data, storage_format=None):
+    """Возвращает (данные для кэша, байты файла).
+
+    json — JSON с отступами (прежний формат), compact — JSON без пробелов
+    с округленными координатами (в 2-3 раза меньше и быстрее разбирается).
+    """
+    storage_format = storage_format or Config.TEMPLATE_STORAGE_FORMAT
+    if storage_format == 'compact':
+        data = quantize_coordinates(data)
+        raw = json.dumps(data, ensure_ascii=False, separators=(',', ':'))
+    else:
+        raw = json.dumps(data, ensure_ascii=False, indent=2)
+    return data, raw.encode('utf-8')
+
+
+def _count(name):
+    with _counters_lock:
+        _counters[name] += 1
+
+
+def load_template_with_version(template_id):
+    """Возвращает (шаблон, версия) или (None, None), если файла нет.
+
+    Шаблон — общий объект из кэша, его нельзя изменять. Версия меняется вместе с файлом
+    и служит ключом для производных кэшей (например, скомпилированных ответов).
+    """
+    path = template_path(template_id)
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None, None
+    signature = (stat.st_mtime_ns, stat.st_size)
+
+    entry = _cache.get(template_id)
+    if entry is not None and entry['signature'] == signature:
+        _count('hits')
+        return entry['data'], signature
+
+    _count('misses')
+    with metrics.timed('templates', 'read'):
+        data = read_template_file(path)
+    _cache.put(template_id, {'signature': signature, 'data': data})
+    return data, signature
+
+
+def load_template(template_id):
+    """Возвращает шаблон (общий объект из кэша — не изменять!) или None, если файла нет"""
+    return load_template_with_version(template_id)[0]
+
+
+def _template_lock(template_id):
+    """Блокировка записи шаблона: чтение версии, проверка и запись — без гонок между воркерами"""
+    return _file_lock(os.path.join(Config.TEMPLATES_FOLDER, '.locks', f"{template_id}.lock"))
+
+
+def _write_atomic(path, raw):
+    """Запись через временный файл и os.replace: читатели видят либо старый, либо новый файл"""
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(raw)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def _store(template_id, data, storage_format=None):
+    """Записывает шаблон (вызывается под блокировкой шаблона) и обновляет кэш и индекс"""
+    path = template_path(template_id)
+    with metrics.timed('templates', 'write'):
+        data, raw = encode_template(data, storage_format)
+        _write_atomic(path, raw)
+
+    stat = os.stat(path)
+    _cache.put(template_id, {'signature': (stat.st_mtime_ns, stat.st_size), 'data': data})
+    _update_index(template_id, data, stat.st_mtime)
+    return data
+
+
+def save_template(data, storage_format=None):
+    """Записывает шаблон целиком (в формате Config.TEMPLATE_STORAGE_FORMAT) и сразу обновляет кэш.
+
+    Номер версии в шаблоне ("version") увеличивается при каждой записи.
+    Возвращает новую версию.
+    """
+    template_id = data['template_id']
+    with _template_lock(template_id):
+        current = load_template(template_id)
+        version = (current or {}).get('version', 0) + 1
+        _store(template_id, {**data, 'version': version}, storage_format)
+    return version
+
+
+def _check_field_values(values):
+    """Типы изменяемых ключей поля: иначе ошибка всплыла бы позже, при проверке работ"""
+    for key in COORDINATE_KEYS + ('page', 'tolerance'):
+        if key not in values or (key == 'tolerance' and values[key] is None):
+            continue
+        value = values[key]
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise ValueError(f"{key} должно быть числом")
+    if 'variants' in values:
+        variants = values['variants']
+        if not isinstance(variants, list) or not all(isinstance(v, str) for v in variants):
+            raise ValueError("variants должно быть списком строк")
+    if 'checkable' in values and not isinstance(values['checkable'], bool):
+        raise ValueError("checkable должно быть true или false")
+
+
+def _apply_field_op(fields, op):
+    if not isinstance(op, dict):
+        raise ValueError("Операция должна быть объектом")
+    action = op.get('op')
+    if action == 'add':
+        field = op.get('field')
+        if not isinstance(field, dict):
+            raise ValueError("field должно быть объектом")
+        if not isinstance(field.get('id'), str) or not field['id']:
+            raise ValueError("Для добавления поля нужен строковый id")
+        _check_field_values(field)
+        if any(f['id'] == field['id'] for f in fields):
+            raise ValueError(f"Поле {field['id']} уже существует")
+        fields.append(dict(field))
+        return
+
+    if action not in ('update', 'delete'):
+        raise ValueError(f"Неизвестная операция: {action}")
+    if not isinstance(op.get('id'), str):
+        raise ValueError("id поля должно быть строкой")
+    index = next((i for i, f in enumerate(fields) if f['id'] == op['id']), None)
+    if index is None:
+        raise ValueError(f"Поле {op['id']} не найдено")
+
+    if action == 'update':
+        # Перемещение, изменение размера, правка вариантов ответа
+        changes = {k: op[k] for k in FIELD_KEYS if k in op}
+        _check_field_values(changes)
+        fields[index] = {**fields[index], **changes}
+    else:
+        del fields[index]
+
+
+def patch_fields(template_id, ops, base_version=None):
+    """Применяет к полям шаблона список операций и записывает результат.
+
+    Операции: {"op": "add", "field": {...}}, {"op": "update", "id": ..., "x": ..., "variants": [...]},
+    {"op": "delete", "id": ...}. Если указан base_version и шаблон с тех пор изменился —
+    TemplateConflict. Некорректная операция — ValueError, шаблон при этом не меняется.
+    Возвращает новую версию или None, если шаблона нет.
+    """
+    with _template_lock(template_id):
+        current = load_template(template_id)
+        if current is None:
+            return None
+        version = current.get('version', 0)
+        if base_version is not None and base_version != version:
+            raise TemplateConflict(f"Шаблон изменен (версия {version}, правки к версии {base_version})")
+
+        # Кэшированный шаблон общий — изменяем копию списка полей
+        fields = [dict(field) for field in current.get('fields', [])]
+        for op in ops:
+            _apply_field_op(fields, op)
+
+        _store(template_id, {**current, 'fields': fields, 'version': version + 1})
+    return version + 1
+
+
+def migrate_templates(storage_format=None):
+    """Перезаписывает все шаблоны в заданном формате. Возвращает (перезаписано, байт до, байт после)"""
+    migrated = bytes_before = bytes_after = 0
+    if not os.path.isdir(Config.TEMPLATES_FOLDER):
+        return migrated, bytes_before, bytes_after
+
+    for filename in sorted(os.listdir(Config.TEMPLATES_FOLDER)):
+        if not filename.endswith('.json'):
+            continue
+        # Имя файла — идентификатор шаблона, даже если внутри template_id другой
+        template_id = filename[:-5]
+        with _template_lock(template_id):
+            with open(template_path(template_id), 'rb') as f:
+                old_raw = f.read()
+            try:
+                data = decode_template(old_raw)
+            except ValueError as e:
+                logger.error("Ошибка чтения шаблона", extra={'template_file': filename, 'error': str(e)})
+                continue
+
+            _, new_raw = encode_template(data, storage_format)
+            bytes_before += len(old_raw)
+            bytes_after += len(new_raw)
+            if new_raw == old_raw:
+                continue
+
+            # Содержимое не меняется, поэтому версия шаблона остается прежней
+            _store(template_id, {**data, 'template_id': template_id}, storage_format)
+            migrated += 1
+
+    return migrated, bytes_before, bytes_after
+
+
+def stats():
+    result = _cache.stats()
+    with _counters_lock:
+        result.update(_counters)
+    return result
+
+
+# ==============================================================================
+# Индекс шаблонов для /list_templates
+# ==============================================================================
+# Хранится в Config.TEMPLATE_INDEX_PATH: {'folder_mtime': ..., 'templates': {id: запись}}.
+# Если папка шаблонов изменилась в обход save_template (mtime папки не совпадает),
+# индекс перестраивается с диска. Запись индекса (пересборка и обновление записи) идет
+# под flock на <индекс>.lock: воркеры gunicorn не теряют записи друг друга.
+_index = None
+_index_mtime = None
+_index_lock = threading.Lock()
+
+
+def _index_entry(template_id, data, mtime):
+    return {
+        'id': data.get('template_id', template_id),
+        'name': str(data.get('name') or template_id),
+        'classes': data.get('classes', []),
+        'pages': len(data.get('files', [])),
+        'updated_at': datetime.fromtimestamp(mtime).isoformat(timespec='seconds')
+    }
+
+
+def _folder_mtime():
+    try:
+        return os.stat(Config.TEMPLATES_FOLDER).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+def _index_write_lock():
+    return _file_lock(f"{Config.TEMPLATE_INDEX_PATH}.lock")
+
+
+def _write_index(index):
+    """Записывает индекс (под _index_write_lock) и делает его текущим в этом процессе"""
+    global _index, _index_mtime
+    _write_atomic(Config.TEMPLATE_INDEX_PATH, json.dumps(index, ensure_ascii=False).encode('utf-8'))
+    with _index_lock:
+        _index = index
+        _index_mtime = os.stat(Config.TEMPLATE_INDEX_PATH).st_mtime_ns
+
+
+def _rebuild():
+    templates = {}
+    folder_mtime = _folder_mtime()
+    if folder_mtime is not None:
+        for filename in os.listdir(Config.TEMPLATES_FOLDER):
+            if not filename.endswith('.json'):
+                continue
+            template_id = filename[:-5]
+            filepath = os.path.join(Config.TEMPLATES_FOLDER, filename)
+            try:
+                data = read_template_file(filepath)
+            except (OSError, ValueError) as e:
+                logger.error("Ошибка чтения шаблона", extra={'template_file': filename, 'error': str(e)})
+                continue
+            templates[template_id] = _index_entry(template_id, data, os.path.getmtime(filepath))
+
+    _write_index({'folder_mtime': folder_mtime, 'templates': templates})
+
+
+@metrics.timed_function('templates', 'rebuild_index')
+def rebuild_index():
+    """Полная пересборка индекса по файлам шаблонов"""
+    with _index_write_lock():
+        _rebuild()
+
+
+def _read_index():
+    """Индекс в памяти; перечитывается, если файл индекса обновил другой процесс. None — индекса нет"""
+    global _index, _index_mtime
+    with _index_lock:
+        try:
+            mtime = os.stat(Config.TEMPLATE_INDEX_PATH).st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+
+        if mtime is not None and mtime != _index_mtime:
+            try:
+                with open(Config.TEMPLATE_INDEX_PATH, 'r', encoding='utf-8') as f:
+                    _index = json.load(f)
+                _index_mtime = mtime
+            except (OSError, ValueError):
+                _index = None
+        return _index
+
+
+def _load_index():
+    if _read_index() is None:
+        rebuild_index()
+    return _index
+
+
+def _current_index():
+    """Индекс, сверенный с папкой шаблонов"""
+    index = _load_index()
+    if index['folder_mtime'] != _folder_mtime():
+        rebuild_index()
+    return _index
+
+
+def _update_index(template_id, data, mtime):
+    # Чтение, правка и запись — под одной блокировкой: иначе одновременные сохранения
+    # в разных процессах затирают записи друг друга
+    with _index_write_lock():
+        index = _read_index()
+        if index is None:
+            _rebuild()
+            return
+        _write_index({
+            'folder_mtime': _folder_mtime(),
+            'templates': {**index['templates'], template_id: _index_entry(template_id, data, mtime)}
+        })
+
+
+def index_version():
+    """mtime_ns файла индекса — меняется при каждом изменении списка шаблонов"""
+    _current_index()
+    return _index_mtime
+
+
+def list_templates(class_name=None, offset=0, limit=None):
+    """Записи индекса (по имени), с фильтром по классу. Возвращает (записи, всего)"""
+    templates = _current_index()['templates'].values()
+    if class_name:
+        templates = [t for t in templates if class_name in t['classes']]
+    templates = sorted(templates, key=lambda t: (t['name'].lower(), t['id']))
+
+    total = len(templates)
+    end = offset + limit if limit is not None else None
+    return templates[offset:end], total
@@ -0,0 +1,7 @@
+import os
+import sys
+
+# Модули приложения лежат в корне проекта
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
@@ -0,0 +1,84 @@
+import pytest
+from config import Config
+import grading
+
+
+@pytest.fixture(autouse=True)
+def fold_homoglyphs(monkeypatch):
+    monkeypatch.setattr(Config, 'ANSWER_FOLD_HOMOGLYPHS', True)
+
+
+def make_key(*variants, tolerance=None):
+    field = {'id': 'f1', 'variants': list(variants)}
+    if tolerance is not None:
+        field['tolerance'] = tolerance
+    return grading.compile_answer_key({'fields': [field]})
+
+
+def is_correct(answer_key, answer):
+    return grading.grade(answer_key, {'f1': answer})['details'][0]['is_correct']
+
+
+@pytest.mark.parametrize('cyrillic, latin', [
+    ('а', 'a'), ('е', 'e'), ('о', 'o'), ('р', 'p'),
+    ('с', 'c'), ('у', 'y'), ('х', 'x'), ('і', 'i'),
+])
+def test_lowercase_lookalikes_are_folded(cyrillic, latin):
+    assert grading.normalize_answer(cyrillic) == latin
+    assert grading.normalize_answer(cyrillic.upper()) == latin
+
+
+@pytest.mark.parametrize('letter', ['в', 'н', 'т', 'м', 'к', 'б', 'г', 'ё'])
+def test_letters_without_lowercase_lookalike_are_kept(letter):
+    assert grading.normalize_answer(letter) == letter
+
+
+def test_fold_table_is_pinned():
+    assert grading.HOMOGLYPHS == str.maketrans({
+        'а': 'a', 'е': 'e', 'о': 'o', 'р': 'p', 'с': 'c', 'у': 'y', 'х': 'x', 'і': 'i'
+    })
+
+
+def test_cyrillic_v_is_not_latin_b():
+    answer_key = make_key('B')
+    assert not is_correct(answer_key, 'в')
+    assert not is_correct(answer_key, 'В')
+    assert is_correct(answer_key, 'b')
+
+
+def test_words_with_non_lookalike_letters_do_not_match():
+    assert not is_correct(make_key('bot'), 'вот')
+    assert not is_correct(make_key('kit'), 'кит')
+
+
+def test_mixed_script_word_matches():
+    # «сжатие» с латинской «c»
+    assert is_correct(make_key('сжатие'), 'cжатие')
+    assert is_correct(make_key('A'), 'а')
+
+
+def test_fold_disabled(monkeypatch):
+    monkeypatch.setattr(Config, 'ANSWER_FOLD_HOMOGLYPHS', False)
+    assert grading.normalize_answer('а') == 'а'
+    assert not is_correct(make_key('A'), 'а')
+
+
+def test_case_and_whitespace_are_normalized():
+    assert is_correct(make_key('Москва'), '  мОСКВА ')
+    assert is_correct(make_key('два слова'), 'два   слова')
+
+
+def test_numeric_tolerance():
+    answer_key = make_key('3.5', tolerance=0.1)
+    assert is_correct(answer_key, '3,55')
+    assert not is_correct(answer_key, '3.7')
+
+
+def test_score_summary():
+    answer_key = grading.compile_answer_key({'fields': [
+        {'id': 'f1', 'variants': ['A']},
+        {'id': 'f2', 'variants': ['B']},
+    ]})
+    result = grading.grade(answer_key, {'f1': 'a', 'f2': 'c'})
+    assert (result['correct_count'], result['total_count'], result['percentage']) == (1, 2, 50.0)
+    assert result['student_answers'] == ['a', 'c']
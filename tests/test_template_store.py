@@ -0,0 +1,121 @@
+import os
+import pytest
+from config import Config
+import template_store
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    """Пустая папка шаблонов и индекс во временном каталоге"""
+    monkeypatch.setattr(Config, 'TEMPLATES_FOLDER', str(tmp_path / 'templates_json'))
+    monkeypatch.setattr(Config, 'TEMPLATE_INDEX_PATH', str(tmp_path / 'templates_index.json'))
+    monkeypatch.setattr(Config, 'TEMPLATE_STORAGE_FORMAT', 'json')
+    monkeypatch.setattr(template_store, '_index', None)
+    monkeypatch.setattr(template_store, '_index_mtime', None)
+    os.makedirs(Config.TEMPLATES_FOLDER)
+    template_store._cache.clear()
+    yield
+    template_store._cache.clear()
+
+
+def field(field_id, **values):
+    return {'id': field_id, 'page': 0, 'x': 10, 'y': 20, 'w': 100, 'h': 30,
+            'variants': ['A'], 'checkable': True, **values}
+
+
+def make_template(fields=None):
+    template_store.save_template({
+        'template_id': 'tpl_test',
+        'name': 'Тест',
+        'files': ['test_page_1.png'],
+        'fields': fields if fields is not None else [field('f1'), field('f2')],
+    })
+    return template_store.load_template('tpl_test')
+
+
+def field_ids():
+    return [f['id'] for f in template_store.load_template('tpl_test')['fields']]
+
+
+def test_add_field(store):
+    make_template()
+    version = template_store.patch_fields('tpl_test', [{'op': 'add', 'field': field('f3', variants=['B'])}])
+    assert version == 2
+    template = template_store.load_template('tpl_test')
+    assert template['version'] == 2
+    assert field_ids() == ['f1', 'f2', 'f3']
+    assert template['fields'][2]['variants'] == ['B']
+
+
+def test_update_moves_and_resizes_in_place(store):
+    make_template()
+    template_store.patch_fields('tpl_test', [
+        {'op': 'update', 'id': 'f1', 'x': 55, 'y': 66, 'w': 200, 'variants': ['C', 'D'], 'name': 'ignored'}
+    ])
+    updated = template_store.load_template('tpl_test')['fields'][0]
+    assert (updated['x'], updated['y'], updated['w'], updated['h']) == (55, 66, 200, 30)
+    assert updated['variants'] == ['C', 'D']
+    assert 'name' not in updated
+    # Порядок полей (порядок вопросов в результатах) не меняется
+    assert field_ids() == ['f1', 'f2']
+
+
+def test_delete_field(store):
+    make_template([field('f1'), field('f2'), field('f3')])
+    template_store.patch_fields('tpl_test', [{'op': 'delete', 'id': 'f2'}])
+    assert field_ids() == ['f1', 'f3']
+
+
+def test_ops_apply_in_order(store):
+    make_template()
+    template_store.patch_fields('tpl_test', [
+        {'op': 'delete', 'id': 'f1'},
+        {'op': 'add', 'field': field('f1')},
+        {'op': 'update', 'id': 'f1', 'page': 1},
+    ])
+    assert field_ids() == ['f2', 'f1']
+    assert template_store.load_template('tpl_test')['fields'][1]['page'] == 1
+
+
+def test_version_conflict(store):
+    make_template()
+    assert template_store.patch_fields('tpl_test', [{'op': 'delete', 'id': 'f1'}], base_version=1) == 2
+    with pytest.raises(template_store.TemplateConflict):
+        template_store.patch_fields('tpl_test', [{'op': 'delete', 'id': 'f2'}], base_version=1)
+    assert field_ids() == ['f2']
+
+
+def test_missing_template(store):
+    assert template_store.patch_fields('tpl_missing', [{'op': 'delete', 'id': 'f1'}]) is None
+
+
+@pytest.mark.parametrize('op', [
+    5,
+    {'op': 'rename', 'id': 'f1'},
+    {'op': 'add'},
+    {'op': 'add', 'field': 5},
+    {'op': 'add', 'field': {'x': 1}},
+    {'op': 'add', 'field': {'id': 7}},
+    {'op': 'add', 'field': field('f1')},
+    {'op': 'add', 'field': field('f3', variants='A')},
+    {'op': 'update', 'id': 'x', 'field': 5},
+    {'op': 'update', 'id': ['f1']},
+    {'op': 'update', 'id': 'f1', 'x': '10'},
+    {'op': 'update', 'id': 'f1', 'w': True},
+    {'op': 'update', 'id': 'f1', 'variants': [1, 2]},
+    {'op': 'update', 'id': 'f1', 'checkable': 'yes'},
+    {'op': 'delete', 'id': 'missing'},
+])
+def test_invalid_op_raises_value_error_and_keeps_template(store, op):
+    make_template()
+    with pytest.raises(ValueError):
+        template_store.patch_fields('tpl_test', [{'op': 'update', 'id': 'f2', 'x': 1}, op])
+    template = template_store.load_template('tpl_test')
+    assert template['version'] == 1
+    assert template['fields'] == [field('f1'), field('f2')]
+
+
+def test_tolerance_may_be_cleared(store):
+    make_template([field('f1', tolerance=0.5)])
+    template_store.patch_fields('tpl_test', [{'op': 'update', 'id': 'f1', 'tolerance': None}])
+    assert template_store.load_template('tpl_test')['fields'][0]['tolerance'] is None
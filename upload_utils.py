@@ -0,0 +1,86 @@
+import os
+import logging
+import hashlib
+import tempfile
+from flask import Request
+from werkzeug.exceptions import RequestEntityTooLarge
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+PDF_MAGIC = b'%PDF-'
+
+
+class HashingUploadFile:
+    """Временный файл в папке загрузок, который считает SHA-256 и размер по мере записи.
+
+    Multipart-парсер Werkzeug пишет сюда тело файла кусками, поэтому загрузка не
+    копируется повторно, а хэш для кэша рендеринга готов сразу после приема.
+    """
+
+    def __init__(self, directory, max_bytes):
+        os.makedirs(directory, exist_ok=True)
+        fd, self.path = tempfile.mkstemp(dir=directory, suffix='.part')
+        self.file = os.fdopen(fd, 'w+b')
+        self.max_bytes = max_bytes
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+        self.head = b''
+
+    def write(self, data):
+        self.size += len(data)
+        if self.size > self.max_bytes:
+            self.discard()
+            raise RequestEntityTooLarge()
+        if len(self.head) < len(PDF_MAGIC):
+            self.head += data[:len(PDF_MAGIC) - len(self.head)]
+        self.sha256.update(data)
+        return self.file.write(data)
+
+    def __getattr__(self, name):
+        # read/seek/tell/flush и прочее — как у обычного файла
+        return getattr(self.file, name)
+
+    def hexdigest(self):
+        return self.sha256.hexdigest()
+
+    def commit(self, path):
+        """Переносит принятый файл на постоянное место"""
+        self.file.close()
+        os.replace(self.path, path)
+
+    def discard(self):
+        self.file.close()
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+class StreamingRequest(Request):
+    """Request, который принимает файлы сразу в папку загрузок с подсчетом хэша"""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return HashingUploadFile(Config.UPLOAD_FOLDER, Config.MAX_UPLOAD_FILE_BYTES)
+
+
+def check_pdf(upload):
+    """Проверка PDF до рендеринга. Возвращает текст ошибки или None"""
+    if not upload.head.startswith(PDF_MAGIC):
+        return 'Файл не является PDF документом'
+
+    import fitz  # PyMuPDF загружается при первой проверке, а не при запуске
+
+    upload.flush()
+    try:
+        with fitz.open(upload.path, filetype='pdf') as doc:
+            if doc.needs_pass:
+                return 'PDF защищен паролем'
+            if doc.page_count == 0:
+                return 'PDF не содержит страниц'
+            if doc.page_count > Config.MAX_PDF_PAGES:
+                return f'Слишком много страниц: {doc.page_count} (максимум {Config.MAX_PDF_PAGES})'
+    except Exception as e:
+        logger.warning("Ошибка проверки PDF", extra={'error': str(e)})
+        return 'Файл PDF поврежден'
+    return None
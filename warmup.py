@@ -0,0 +1,88 @@
+import sys
+import time
+import logging
+import threading
+from datetime import datetime
+from config import Config
+from auth_utils import auth_manager
+import template_store
+import grading
+
+# Фоновый прогрев после запуска: импорт PyMuPDF, подключение к таблице пользователей
+# и загрузка последних шаблонов с их ключами ответов. Запуск приложения его не ждет,
+# а /ready отвечает 503, пока прогрев идет (Config.WARMUP_ON_START).
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_state = {'state': 'disabled', 'started_at': None, 'finished_at': None, 'steps': {}}
+
+
+def _import_fitz():
+    import fitz
+    return fitz.VersionBind
+
+
+def _preload_templates():
+    """Шаблоны, измененные последними (до WARMUP_TEMPLATES_LIMIT), и их ключи ответов"""
+    templates, _ = template_store.list_templates()
+    templates = sorted(templates, key=lambda t: t['updated_at'], reverse=True)
+    loaded = 0
+    for entry in templates[:Config.WARMUP_TEMPLATES_LIMIT]:
+        template, version = template_store.load_template_with_version(entry['id'])
+        if template is None:
+            continue
+        grading.get_answer_key(entry['id'], version, template)
+        loaded += 1
+    return loaded
+
+
+STEPS = (
+    ('fitz', _import_fitz),
+    ('templates', _preload_templates),
+    ('auth', auth_manager.warm_up),
+)
+
+
+def _run():
+    for name, func in STEPS:
+        started = time.perf_counter()
+        try:
+            result, error = func(), None
+        except Exception as e:
+            result, error = None, str(e)
+            logger.error("Ошибка прогрева", extra={'step': name, 'error': error})
+        with _lock:
+            _state['steps'][name] = {
+                'result': result,
+                'error': error,
+                'duration_ms': round((time.perf_counter() - started) * 1000, 1)
+            }
+
+    with _lock:
+        _state['state'] = 'done'
+        _state['finished_at'] = datetime.now().isoformat(timespec='seconds')
+        steps = dict(_state['steps'])
+    logger.info("Прогрев завершен", extra={'steps': steps})
+
+
+def start():
+    """Запускает прогрев в фоновом потоке (один раз на процесс)"""
+    with _lock:
+        if _state['state'] != 'disabled':
+            return
+        _state['state'] = 'running'
+        _state['started_at'] = datetime.now().isoformat(timespec='seconds')
+    threading.Thread(target=_run, name="warmup", daemon=True).start()
+
+
+def is_ready():
+    """True, если прогрев завершен или не запускался"""
+    with _lock:
+        return _state['state'] != 'running'
+
+
+def status():
+    with _lock:
+        state = dict(_state, steps=dict(_state['steps']))
+    state['modules'] = {name: name in sys.modules for name in ('fitz', 'gspread')}
+    return state
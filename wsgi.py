@@ -0,0 +1,5 @@
+# Точка входа WSGI для продакшена:
+#   APP_CONFIG=production SECRET_KEY=... gunicorn --workers 2 --threads 8 wsgi:app
+from app import create_app
+
+app = create_app()